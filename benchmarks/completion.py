@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Per-keystroke completion latency against a database with many tables.
+
+Compares the prefix index used by the completers with a linear startswith scan over the same candidates. Keystrokes
+that end a word prefix and keystrokes right after a space, comma or parenthesis (where nothing has been typed yet and
+every candidate matches) are reported separately, the number of completions returned is shown for each.
+
+    $ python -m benchmarks.completion [N_TABLES]
+"""
+
+# Standard Library
+import sqlite3
+import sys
+from statistics import mean, median
+from time import perf_counter
+from typing import Callable, List, Tuple
+
+# 3rd Party
+from prompt_toolkit.completion import Completion
+from prompt_toolkit.document import Document
+
+# Project
+from sqliterepl.completions import _SQLCompleter
+from sqliterepl.schema import SchemaCache
+
+QUERIES: List[str] = [
+    'SELECT customer_name, order_total FROM orders_1234 WHERE created_at > 0',
+    'PRAGMA table_info(events_42)',
+    'INSERT INTO audit_log_999 VALUES (1, 2)',
+]
+
+
+def build_schema(n_tables: int) -> SchemaCache:
+    con = sqlite3.connect(':memory:')
+    for i in range(n_tables):
+        con.execute(f'CREATE TABLE t_{i} (id INTEGER, name_{i % 100} TEXT, created_at_{i % 50} REAL)')
+    schema = SchemaCache()
+    schema.refresh(con)
+    return schema
+
+
+def keystrokes() -> List[Document]:
+    return [Document(q[:i]) for q in QUERIES for i in range(1, len(q) + 1)]
+
+
+def linear(schema: SchemaCache) -> Callable[[Document], int]:
+    words: List[Tuple[str, str]] = \
+        schema.table_index.prefix('') + schema.column_index.prefix('') + _SQLCompleter.INDEX.prefix('')
+
+    def complete(doc: Document) -> int:
+        word = doc.get_word_before_cursor(WORD=True)
+        lower, upper = word.lower(), word.upper()
+        pos = doc.find_boundaries_of_current_word(WORD=True)[0]
+        return sum(1 for w, meta in words if w.startswith(lower) or w.startswith(upper)
+                   for _ in [Completion(w, start_position=pos, display_meta=meta)])
+
+    return complete
+
+
+def indexed(schema: SchemaCache) -> Callable[[Document], int]:
+    completer = _SQLCompleter(schema)
+    return lambda doc: sum(1 for _ in completer.get_completions(doc, None))
+
+
+def bench(name: str, complete: Callable[[Document], int], docs: List[Document]) -> None:
+    timings: List[float] = []
+    results: List[int] = []
+    for doc in docs:
+        start = perf_counter()
+        results.append(complete(doc))
+        timings.append((perf_counter() - start) * 1000)
+    timings.sort()
+    print(f'{name:<16} mean {mean(timings):8.3f} ms  median {median(timings):8.3f} ms  '
+          f'p95 {timings[int(len(timings) * 0.95)]:8.3f} ms  max {timings[-1]:8.3f} ms  '
+          f'results {mean(results):7.1f}')
+
+
+if __name__ == '__main__':
+    n: int = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    schema: SchemaCache = build_schema(n)
+    docs: List[Document] = keystrokes()
+    empty: List[Document] = [doc for doc in docs if not _SQLCompleter.WORD.search(doc.text_before_cursor).group()]
+    prefixed: List[Document] = [doc for doc in docs if doc not in empty]
+    n_candidates: int = len(schema.table_index) + len(schema.column_index) + len(_SQLCompleter.INDEX)
+    print(f'{n} tables, {n_candidates} candidates, {len(prefixed)} prefix and {len(empty)} empty word keystrokes')
+    for label, group in [('prefix', prefixed), ('empty', empty)]:
+        bench(f'linear ({label})', linear(schema), group)
+        bench(f'indexed ({label})', indexed(schema), group)
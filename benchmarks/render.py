@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Time to render query results with the built-in table renderer against tabulate, for every style it draws natively.
+
+The rows (integers, reals, short and long text, NULLs) are drawn three ways: by one tabulate() call over all of them
+(how results were printed before they were streamed), in batches by the tabulate-backed layout and in batches by the
+native one, the way print_cursor does. Two checks on the output: the native layout drawing all rows as one batch
+against tabulate(), and the two streamed layouts against each other (streamed tables can differ from tabulate() as
+later batches widen columns).
+
+    $ python -m benchmarks.render [ROWS] [COLUMNS]
+"""
+
+# Standard Library
+import random
+import sys
+from time import perf_counter
+from typing import Any, List, Sequence, Tuple, Type, Union
+
+# Relative
+from sqliterepl.render import BATCH_SIZE, NATIVE_STYLES, _Layout, _NativeLayout, tabulate
+
+
+def make_rows(n: int, columns: int) -> List[Tuple[Any, ...]]:
+    random.seed(0)
+    kinds = [lambda: random.randint(-10 ** 6, 10 ** 6),
+             lambda: random.random() * 1000,
+             lambda: random.choice(['red', 'green', 'blue', None]),
+             lambda: ' '.join(random.choice(['lorem', 'ipsum', 'dolor', 'sit', 'amet']) for _ in range(6))]
+    return [tuple(kinds[c % len(kinds)]() for c in range(columns)) for _ in range(n)]
+
+
+def draw(layout_class: Type[Union[_Layout, _NativeLayout]], rows: Sequence[Sequence[Any]], style: str,
+         sample: int = 50) -> Tuple[float, str]:
+    start: float = perf_counter()
+    layout = layout_class(rows[:sample], style)
+    out: List[str] = [layout.render(rows[:sample], True)]
+    for i in range(sample, len(rows), BATCH_SIZE):
+        out.append(layout.render(rows[i:i + BATCH_SIZE]))
+    out.extend(layout.tail)
+    return perf_counter() - start, '\n'.join(out)
+
+
+def main() -> None:
+    n: int = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    columns: int = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    rows: List[Tuple[Any, ...]] = make_rows(n, columns)
+
+    print(f'{n:,} rows x {columns} columns')
+    print(f'{"style":8} {"tabulate()":>11} {"streamed":>10} {"native":>10} {"speed-up":>9}  '
+          f'same as tabulate()  same as streamed')
+    for style in NATIVE_STYLES:
+        start: float = perf_counter()
+        expected: str = tabulate(rows, tablefmt=style)
+        whole: float = perf_counter() - start
+        streamed, streamed_out = draw(_Layout, rows, style)
+        native, native_out = draw(_NativeLayout, rows, style)
+        same: bool = draw(_NativeLayout, rows, style, len(rows))[1] == expected
+        print(f'{style:8} {whole:10.3f}s {streamed:9.3f}s {native:9.3f}s {whole / native:8.1f}x  '
+              f'{"yes" if same else "NO":18}  {"yes" if native_out == streamed_out else "NO"}')
+
+
+if __name__ == '__main__':
+    main()
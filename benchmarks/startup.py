@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Cold-start cost of the REPL measured with python -X importtime.
+
+Reports the cumulative import time of sqliterepl.main, the slowest imports it pulls in and the wall time of
+sqliterepl --help. Exits with status 1 if importing sqliterepl.main loads any of the heavy modules that are meant to
+be imported on first use only.
+
+    $ python -m benchmarks.startup [RUNS]
+"""
+
+# Standard Library
+import re
+import subprocess
+import sys
+from statistics import median
+from time import perf_counter
+from typing import Dict, List, Tuple
+
+# modules that must not be imported by "import sqliterepl.main"
+HEAVY: Tuple[str, ...] = ('prompt_toolkit', 'pygments.lexers', 'pygments.styles', 'tabulate')
+
+_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def import_times() -> Dict[str, Tuple[int, int]]:
+    """(self, cumulative) import time in microseconds of every module imported by sqliterepl.main.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import sqliterepl.main'],
+                            stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    times: Dict[str, Tuple[int, int]] = {}
+    for line in result.stderr.splitlines():
+        m = _LINE.match(line)
+        if m is not None:
+            times[m.group(4)] = (int(m.group(1)), int(m.group(2)))
+    return times
+
+
+def help_time() -> float:
+    start: float = perf_counter()
+    subprocess.run([sys.executable, '-c', 'from sqliterepl.main import main; main()', '--help'],
+                   stdout=subprocess.DEVNULL, check=True)
+    return perf_counter() - start
+
+
+def main() -> None:
+    runs: int = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    samples: List[Dict[str, Tuple[int, int]]] = [import_times() for _ in range(runs)]
+    total: float = median(s['sqliterepl.main'][1] for s in samples) / 1000
+    print(f'import sqliterepl.main   {total:8.1f} ms (median of {runs})')
+
+    print('\nslowest imports (cumulative, last run):')
+    last: Dict[str, Tuple[int, int]] = samples[-1]
+    for name, (_, cumulative) in sorted(last.items(), key=lambda kv: -kv[1][1])[1:11]:
+        print(f'  {cumulative / 1000:8.1f} ms  {name}')
+
+    print(f'\nsqliterepl --help         {median(help_time() for _ in range(runs)) * 1000:8.1f} ms (median of {runs})')
+
+    heavy: List[str] = [prefix for prefix in HEAVY if any(name.startswith(prefix) for name in last)]
+    if heavy:
+        print(f'\nheavy modules imported eagerly: {", ".join(heavy)}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
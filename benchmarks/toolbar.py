@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Cost of rendering the bottom toolbar, which prompt_toolkit asks for on every redraw (every key press).
+
+before  the old dict-backed context (every attribute read goes through eval) rebuilding the toolbar on every render
+after   the slotted context, rebuilding only after a setting shown in the toolbar changed (and when it did)
+
+Also reports the cost of reading an attribute of either context.
+
+    $ python -m benchmarks.toolbar [RENDERS]
+"""
+
+# Standard Library
+import sys
+from timeit import timeit
+from types import SimpleNamespace
+from typing import Any, Optional
+
+# 3rd Party
+from prompt_toolkit import HTML
+
+# Relative
+from sqliterepl.context import SqliteCtxt
+from sqliterepl.executor import Stats
+from sqliterepl.utils import set_toolbar, toolbar_markup
+
+
+class DictContext(dict):
+    """The context as it was before, attributes of a dict read with eval.
+    """
+
+    def __getattr__(self, item: str) -> Optional[Any]:
+        return eval(f'self["{item}"]', globals(), locals()) if item in self.keys() else None
+
+    def __setattr__(self, key: str, value: Any) -> None:
+        self[key] = value
+
+
+class Session:
+    """Just enough of a PromptSession to hold the toolbar (never running, so never redrawn).
+    """
+    bottom_toolbar: Any = None
+    app: SimpleNamespace = SimpleNamespace(is_running=False)
+
+
+def settings(context: Any) -> Any:
+    context.database = '/home/user/data/app.db'
+    context.multiline = False
+    context.PWD = '/home/user/data'
+    context.style = 'monokai'
+    context.table_style = 'simple'
+    context.timer = True
+    context.show_stats = False
+    context.stats = Stats(0.0123, 0.01, 0.001, 42, 0, 12000, 4096, 1)
+    context.backup_status = None
+    return context
+
+
+def main() -> None:
+    renders: int = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    old: DictContext = settings(DictContext())
+    before: float = timeit(lambda: HTML(toolbar_markup(old)), number=renders)
+
+    new: SqliteCtxt = settings(SqliteCtxt())
+    new.prompt_session = Session()
+    set_toolbar(new)
+    toolbar = new.prompt_session.bottom_toolbar
+    after: float = timeit(toolbar, number=renders)
+
+    def change() -> None:
+        new.timer = not new.timer
+        toolbar()
+
+    changed: float = timeit(change, number=renders // 10)
+
+    print(f'toolbar render, before       {before / renders * 1e6:8.2f} us')
+    print(f'toolbar render, after        {after / renders * 1e6:8.2f} us')
+    print(f'  after a setting changed    {changed / (renders // 10) * 1e6:8.2f} us')
+    print(f'attribute read, before       {timeit(lambda: old.database, number=renders) / renders * 1e6:8.3f} us')
+    print(f'attribute read, after        {timeit(lambda: new.database, number=renders) / renders * 1e6:8.3f} us')
+
+
+if __name__ == '__main__':
+    main()
@@ -27,7 +27,7 @@ with open(join(abspath(dirname(__file__)), 'README.md'), encoding='utf-8') as re
           long_description=readme.read(),
           long_description_content_type='text/markdown',
 
-          python_requires='>=3.6',
+          python_requires='>=3.7',
 
           # The project's main homepage.
           url='https://github.com/nl253/SQLiteREPL',
@@ -61,7 +61,7 @@ with open(join(abspath(dirname(__file__)), 'README.md'), encoding='utf-8') as re
 
           install_requires=[
               'prompt_toolkit>=2.0',
-              'tabulate>=0.8.1', 
+              'tabulate>=0.8.3',
               'pygments>=2.2.0',
           ],
           entry_points={
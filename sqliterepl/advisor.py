@@ -0,0 +1,339 @@
+"""
+Index advisor (in the spirit of .expert in the official sqlite3 client).
+
+Columns compared for equality, compared by range and sorted on in WHERE, ON, GROUP BY and ORDER BY are collected per
+table, an index is proposed for each table that has no index starting with the same columns. The proposals are tried
+on a copy of the schema in memory (with the row estimates of the real database in sqlite_stat1) and only those the
+query planner picks up are kept. The gain is estimated from the plans before and after: a SCAN visits every row of
+the table, a SEARCH the rows per key sqlite_stat1 gives for the columns compared for equality (a quarter of them for
+a range, as the query planner assumes).
+"""
+
+# Standard Library
+import re
+import sqlite3
+from logging import Logger, getLogger
+from math import log2
+from sqlite3 import Connection, Error
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Pattern, Set, Tuple
+
+# 3rd Party
+from pygments.token import Comment, Name, Number, Operator, Punctuation, String
+
+# Relative
+from .plan import PlanRow, query_plan, row_estimate, tree
+from .tokens import Token, aliases, lex
+from .transfer import quote
+
+log: Logger = getLogger()
+
+_EQUALITY: Set[str] = {'=', '==', 'IN', 'IS'}
+_RANGE: Set[str] = {'<', '<=', '>', '>=', 'BETWEEN', 'LIKE', 'GLOB'}
+_COMPARISON: Set[str] = {'<', '>', '=', '!'}
+_FILTER_KEYWORDS: Set[str] = {'WHERE', 'ON', 'HAVING'}
+_OTHER_KEYWORDS: Set[str] = {
+    'SELECT', 'FROM', 'JOIN', 'LIMIT', 'OFFSET', 'SET', 'VALUES', 'UNION', 'EXCEPT', 'INTERSECT', 'RETURNING',
+    'WINDOW',
+}
+# rows read to estimate the selectivity of an index
+SAMPLE: int = 10000
+# "SCAN t", "SEARCH t USING INDEX i (a=? AND b>?)" and so on
+_STEP: Pattern = re.compile(r'^(SCAN|SEARCH) (?:TABLE )?([^\s()]+)(?: AS \S+)?(?: USING '
+                               r'(?:(?:COVERING )?INDEX (\S+)|INTEGER PRIMARY KEY))?(?: \((.*)\))?')
+
+
+class Advice(NamedTuple):
+    sql: str
+    # CREATE INDEX statements the query planner would use
+    indexes: List[str]
+    before: List[PlanRow]
+    after: List[PlanRow]
+    # estimated rows visited
+    cost_before: float
+    cost_after: float
+
+    def report(self) -> List[str]:
+        if not self.indexes:
+            return ['(no new indexes would help)']
+        if self.cost_after < self.cost_before:
+            gain: str = f'{self.cost_before / max(self.cost_after, 1):,.0f}x fewer'
+        else:
+            gain = 'but no sort'
+        return self.indexes + [
+            f'-- estimated rows visited: ~{self.cost_before:,.0f} -> ~{self.cost_after:,.0f} ({gain})',
+            *(f'-- before {line}' for line in tree(self.before)),
+            *(f'-- after  {line}' for line in tree(self.after)),
+        ]
+
+
+def _operator(tokens: List[Token], start: int, step: int) -> str:
+    """Operator starting at tokens[start] reading in direction step (pygments splits ">=" into ">" and "=").
+    """
+    ops: List[str] = []
+    i: int = start
+    while 0 <= i < len(tokens) and tokens[i][1] in Operator and tokens[i][2] in _COMPARISON:
+        ops.append(tokens[i][2])
+        i += step
+    if ops:
+        return ''.join(ops if step > 0 else reversed(ops))
+    return tokens[start][2].upper() if 0 <= start < len(tokens) else ''
+
+
+def candidates(sql: str, columns: Dict[str, List[str]]) -> Dict[str, List[str]]:
+    """Columns worth indexing in sql per table: those compared for equality, then those sorted on or else the first one
+    compared by range.
+
+    columns maps the tables in the database to their columns (see SchemaCache.columns).
+    """
+    tokens: List[Token] = lex(sql)
+    known: Dict[str, str] = {table.casefold(): table for table in columns}
+    tables: Dict[str, str] = {alias.casefold(): known[table.casefold()]
+                              for alias, table in aliases(sql).items() if table.casefold() in known}
+    owners: Dict[str, List[str]] = {}
+    for table in set(tables.values()):
+        for column in columns[table]:
+            owners.setdefault(column.casefold(), []).append(table)
+
+    found: Dict[str, Dict[str, List[str]]] = {}
+    clause: Optional[str] = None
+
+    for i, (_, ttype, value) in enumerate(tokens):
+        word: str = value.upper()
+        if word in _FILTER_KEYWORDS:
+            clause = 'filter'
+            continue
+        elif word == 'BY' and i > 0 and tokens[i - 1][2].upper() in {'ORDER', 'GROUP'}:
+            clause = 'order'
+            continue
+        elif word in _OTHER_KEYWORDS:
+            clause = None
+            continue
+        if clause is None or ttype in Punctuation or ttype in Operator or ttype in Number or \
+                (ttype in String and ttype not in String.Symbol) or ttype in Comment:
+            continue
+        # function calls and the qualifier of qualified names are not columns
+        if i + 1 < len(tokens) and tokens[i + 1][2] in {'(', '.'}:
+            continue
+
+        column: str = value.strip('"`[]')
+        table: Optional[str] = None
+        if i >= 2 and tokens[i - 1][2] == '.':
+            table = tables.get(tokens[i - 2][2].strip('"`[]').casefold())
+        elif ttype in Name or ttype in String.Symbol or column.casefold() in owners:
+            owner: List[str] = owners.get(column.casefold(), [])
+            # ambiguous unqualified names are skipped
+            table = owner[0] if len(owner) == 1 else None
+        if table is None or column.casefold() not in {c.casefold() for c in columns[table]}:
+            continue
+
+        if clause == 'order':
+            kind: str = 'order'
+        elif _operator(tokens, i + 1, 1) in _EQUALITY or _operator(tokens, i - 1, -1) in _EQUALITY:
+            kind = 'equality'
+        elif _operator(tokens, i + 1, 1) in _RANGE or _operator(tokens, i - 1, -1) in _RANGE:
+            kind = 'range'
+        else:
+            continue
+        kinds: Dict[str, List[str]] = found.setdefault(table, {'equality': [], 'range': [], 'order': []})
+        if column not in kinds[kind]:
+            kinds[kind].append(column)
+
+    proposals: Dict[str, List[str]] = {}
+    for table, kinds in found.items():
+        cols: List[str] = list(kinds['equality'])
+        tail: List[str] = kinds['order'] if kinds['order'] else kinds['range'][:1]
+        cols.extend(c for c in tail if c not in cols)
+        if cols:
+            proposals[table] = cols
+    return proposals
+
+
+def _rowid_alias(con: Connection, table: str) -> Optional[str]:
+    """The INTEGER PRIMARY KEY column of table (if any), lookups on it never need an index.
+    """
+    pk = con.execute("SELECT name FROM pragma_table_info(?) WHERE pk = 1 AND upper(type) = 'INTEGER' "
+                     "AND (SELECT count(*) FROM pragma_table_info(?) WHERE pk > 0) = 1", (table, table)).fetchone()
+    return pk[0] if pk is not None else None
+
+
+def _indexed(con: Connection, table: str) -> List[List[str]]:
+    """Columns of every index on table.
+    """
+    return [[name for (name,) in con.execute('SELECT name FROM pragma_index_info(?) ORDER BY seqno', (index,))]
+            for (index,) in con.execute('SELECT name FROM pragma_index_list(?)', (table,)).fetchall()]
+
+
+def index_name(table: str, columns: Iterable[str]) -> str:
+    return re.sub(r'\W', '_', f'idx_{table}_{"_".join(columns)}')
+
+
+def index_stat(con: Connection, table: str, columns: List[str], rows: int) -> str:
+    """sqlite_stat1 entry for an index on table (columns) estimated from the first SAMPLE rows (like ANALYZE with
+    analysis_limit).
+    """
+    distinct: str = ', '.join(f'count(DISTINCT {", ".join(map(quote, columns[:i]))})' if i == 1 else
+                              f'(SELECT count(*) FROM (SELECT DISTINCT {", ".join(map(quote, columns[:i]))} '
+                              f'FROM sample))'
+                              for i in range(1, len(columns) + 1))
+    counts = con.execute(f'WITH sample AS (SELECT * FROM {quote(table)} LIMIT {SAMPLE}) '
+                         f'SELECT count(*), {distinct} FROM sample').fetchone()
+    return ' '.join([str(rows)] + [str(-(-counts[0] // max(d, 1))) for d in counts[1:]])
+
+
+def schema_copy(con: Connection) -> Connection:
+    """Empty in-memory copy of the main schema of con with the row estimates of con.
+    """
+    copy: Connection = sqlite3.connect(':memory:')
+    objects = con.execute(
+        "SELECT type, name, tbl_name, sql FROM sqlite_master WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' "
+        "ORDER BY CASE type WHEN 'table' THEN 0 WHEN 'index' THEN 1 ELSE 2 END").fetchall()
+    for kind, name, _, sql in objects:
+        try:
+            copy.execute(sql)
+        except Error as e:
+            # e.g. virtual tables of modules that are not available here
+            log.debug(f'could not copy {kind} {name}: {e}')
+    copy.execute('ANALYZE')
+    try:
+        copy.executemany('INSERT INTO sqlite_stat1 VALUES (?, ?, ?)',
+                         con.execute('SELECT tbl, idx, stat FROM sqlite_stat1').fetchall())
+    except Error:
+        # never analyzed, estimate what ANALYZE would have found
+        for kind, name, table, _ in objects:
+            rows: int = row_estimate(con, table) or 0
+            try:
+                if kind == 'table':
+                    copy.execute('INSERT INTO sqlite_stat1 VALUES (?, NULL, ?)', (name, str(rows)))
+                elif kind == 'index':
+                    columns: List[str] = [c for (c,) in con.execute(
+                        'SELECT name FROM pragma_index_info(?) ORDER BY seqno', (name,))]
+                    copy.execute('INSERT INTO sqlite_stat1 VALUES (?, ?, ?)',
+                                 (table, name, index_stat(con, table, columns, rows)))
+            except Error as e:
+                log.debug(f'no estimate for {kind} {name}: {e}')
+    # makes the planner reload sqlite_stat1
+    copy.execute('ANALYZE sqlite_master')
+    return copy
+
+
+def _sorts(plan: List[PlanRow]) -> int:
+    return sum(1 for _, _, _, detail in plan if detail.startswith('USE TEMP B-TREE'))
+
+
+class Advisor:
+    def __init__(self, con: Connection, columns: Dict[str, List[str]]):
+        self.con: Connection = con
+        self.columns: Dict[str, List[str]] = columns
+        self.copy: Connection = schema_copy(con)
+        self._rows: Dict[str, Optional[int]] = {}
+        # CREATE INDEX statements proposed so far mapped to (table, columns)
+        self.proposed: Dict[str, Tuple[str, List[str]]] = {}
+
+    def close(self) -> None:
+        self.copy.close()
+
+    def _rows_of(self, table: str) -> int:
+        if table not in self._rows:
+            self._rows[table] = row_estimate(self.con, table)
+        return self._rows[table] or 1
+
+    def _search(self, rows: int, index: Optional[str], condition: str) -> float:
+        """Rows visited by a SEARCH through index with condition (e.g. "a=? AND b>?").
+        """
+        terms: List[str] = condition.split(' AND ') if condition else []
+        equal: int = sum(1 for term in terms if term.endswith('=?') and term[-3:-2] not in {'<', '>'})
+        stat: List[str] = []
+        if index is not None:
+            found = self.copy.execute('SELECT stat FROM sqlite_stat1 WHERE idx = ?', (index,)).fetchone()
+            stat = found[0].split() if found is not None else []
+        if index is None and equal:
+            # INTEGER PRIMARY KEY or an automatic index
+            visited: float = 1
+        elif 0 < equal < len(stat) and stat[equal].isdigit():
+            visited = int(stat[equal])
+        else:
+            visited = rows
+        if len(terms) > equal:
+            visited /= 4
+        return max(visited, 1) + log2(max(rows, 1))
+
+    def cost(self, sql: str, plan: List[PlanRow]) -> float:
+        """Estimated rows visited by the plan (ignoring that joins are nested loops).
+        """
+        names: Dict[str, str] = {alias.casefold(): table for alias, table in aliases(sql).items()}
+        total: float = 0
+        for _, _, _, detail in plan:
+            m = _STEP.match(detail)
+            if m is None:
+                continue
+            rows: int = self._rows_of(names.get(m.group(2).casefold(), m.group(2)))
+            total += rows if m.group(1) == 'SCAN' else self._search(rows, m.group(3), m.group(4) or '')
+        return total
+
+    def advise(self, sql: str, params: Any = ()) -> Advice:
+        before: List[PlanRow] = query_plan(self.copy, sql, params)
+        created: Dict[str, str] = {}
+        for table, columns in candidates(sql, self.columns).items():
+            columns = [c for c in columns if c != _rowid_alias(self.copy, table)]
+            if not columns or any(index[:len(columns)] == columns for index in _indexed(self.copy, table)):
+                continue
+            name: str = index_name(table, columns)
+            create: str = f'CREATE INDEX {quote(name)} ON {quote(table)} ({", ".join(map(quote, columns))});'
+            try:
+                self.copy.execute(create)
+                created[name] = create
+                self.proposed[create] = (table, columns)
+                self.copy.execute('INSERT INTO sqlite_stat1 VALUES (?, ?, ?)',
+                                  (table, name, index_stat(self.con, table, columns, self._rows_of(table))))
+            except Error as e:
+                log.debug(f'could not try {create}: {e}')
+        self.copy.execute('ANALYZE sqlite_master')
+        try:
+            after: List[PlanRow] = query_plan(self.copy, sql, params)
+            cost_after: float = self.cost(sql, after)
+        finally:
+            for name in created:
+                self.copy.execute(f'DROP INDEX {quote(name)}')
+                self.copy.execute('DELETE FROM sqlite_stat1 WHERE idx = ?', (name,))
+            self.copy.execute('ANALYZE sqlite_master')
+        used: List[str] = [create for name, create in created.items()
+                           if any(re.search(rf'\b{re.escape(name)}\b', detail) for _, _, _, detail in after)]
+        cost_before: float = self.cost(sql, before)
+        # an index that saves neither rows nor a sort is not worth its upkeep
+        if not used or (cost_after >= cost_before and _sorts(after) >= _sorts(before)):
+            return Advice(sql, [], before, before, cost_before, cost_before)
+        return Advice(sql, used, before, after, cost_before, cost_after)
+
+
+def is_advisable(sql: str) -> bool:
+    """Whether sql is a statement an index could speed up.
+    """
+    words: List[str] = sql.split(None, 1)
+    return bool(words) and words[0].upper() in {'SELECT', 'WITH', 'UPDATE', 'DELETE', 'INSERT', 'REPLACE'}
+
+
+def review(advisor: Advisor, statements: Iterable[str]) -> List[Tuple[str, int, float]]:
+    """(CREATE INDEX statement, number of statements it helps, estimated rows saved) for statements, most useful first.
+    """
+    found: Dict[str, Tuple[int, float]] = {}
+    for sql in statements:
+        try:
+            advice: Advice = advisor.advise(sql)
+        except (Error, ValueError) as e:
+            # e.g. statements with parameters or tables that are gone
+            log.debug(f'cannot advise on {sql!r}: {e}')
+            continue
+        for create in advice.indexes:
+            count, saved = found.get(create, (0, 0))
+            found[create] = (count + 1, saved + advice.cost_before - advice.cost_after)
+
+    # an index on (a) is not needed next to one on (a, b), fold the statements it helps into the wider one
+    for create in sorted(found, key=lambda c: len(advisor.proposed[c][1])):
+        table, columns = advisor.proposed[create]
+        wider: Optional[str] = next((other for other in found if other != create and advisor.proposed[other][0] == table
+                                     and advisor.proposed[other][1][:len(columns)] == columns), None)
+        if wider is not None:
+            count, saved = found.pop(create)
+            found[wider] = (found[wider][0] + count, found[wider][1] + saved)
+
+    return sorted(((create, count, saved) for create, (count, saved) in found.items()), key=lambda x: -x[2])
@@ -0,0 +1,193 @@
+"""
+Copying whole databases with the online backup API (page by page, no SQL round-trip).
+
+Backups run in steps of a few pages. Between steps the source is unlocked so writers on a live database can get in,
+a Throttle can additionally pause between steps to cap the throughput.
+"""
+
+# Standard Library
+import sys
+from hashlib import sha256
+from threading import Thread
+from time import perf_counter, sleep
+from os import remove
+from os.path import exists, getsize, isfile
+from sqlite3 import Connection, Error, connect
+from typing import Callable, Optional
+
+# Relative
+from .transfer import BATCH_SIZE, quote
+from .utils import log
+
+PAGES: int = 1024
+
+_HEADER: bytes = b'SQLite format 3\x00'
+
+ProgressCallback = Callable[[int, int, int], None]
+
+
+def print_progress(status: int, remaining: int, total: int) -> None:
+    """Backup progress callback that keeps rewriting the same line on a terminal.
+    """
+    if sys.stdout.isatty():
+        print(f'Copied {total - remaining} of {total} pages...', end='\r', flush=True)
+
+
+class Throttle:
+    """Backup progress callback that pauses for pause seconds after every step and long enough to keep the throughput
+    under rate pages per second (if rate > 0) and reports progress to report.
+    """
+
+    def __init__(self, pages: int, rate: float = 0, pause: float = 0, report: Optional[ProgressCallback] = None):
+        self.pages: int = pages
+        self.rate: float = rate
+        self.pause: float = pause
+        self.report: Optional[ProgressCallback] = report
+        self.last: float = perf_counter()
+
+    def __call__(self, status: int, remaining: int, total: int) -> None:
+        if self.report is not None:
+            self.report(status, remaining, total)
+        if remaining == 0:
+            return
+        delay: float = self.pause
+        if self.rate > 0:
+            delay = max(delay, self.pages / self.rate - (perf_counter() - self.last))
+        if delay > 0:
+            sleep(delay)
+        self.last = perf_counter()
+
+
+def copy(source: Connection, target: Connection, pages: int = PAGES,
+         progress: Optional[ProgressCallback] = None) -> None:
+    """Copy source into target pages pages at a time (all at once if pages < 1).
+    """
+    source.backup(target, pages=pages if pages > 0 else -1, progress=progress)
+
+
+def is_empty(path: str) -> bool:
+    """Whether there is nothing at path worth keeping: no file, an empty file or an SQLite database without a schema.
+    """
+    if not exists(path):
+        return True
+    elif not isfile(path):
+        return False
+    elif getsize(path) == 0:
+        return True
+    with open(path, 'rb') as f:
+        if f.read(len(_HEADER)) != _HEADER:
+            return False
+    try:
+        con: Connection = connect(f'file:{path}?mode=ro', uri=True, timeout=0)
+        try:
+            return con.execute('SELECT count(*) FROM sqlite_master').fetchone()[0] == 0
+        finally:
+            con.close()
+    except Error:
+        # locked or corrupt, either way not ours to replace
+        return False
+
+
+def vacuum_into(source: Connection, path: str) -> None:
+    """Write a compacted copy of source to path, which must not exist or be empty (FileExistsError otherwise).
+    """
+    if not is_empty(path):
+        raise FileExistsError(f'{path} is not an empty database, refusing to overwrite it')
+    if isfile(path):
+        remove(path)
+    source.execute('VACUUM INTO ?', (path,))
+
+
+def mismatched(source: Connection, target: Connection) -> bool:
+    """Whether target is in WAL mode with another page size than source, which the backup API cannot copy into (but
+    VACUUM INTO can replace if target is empty).
+    """
+    try:
+        if target.execute('PRAGMA journal_mode').fetchone()[0].lower() != 'wal':
+            return False
+        return source.execute('PRAGMA page_size').fetchone()[0] != target.execute('PRAGMA page_size').fetchone()[0]
+    except Error:
+        return False
+
+
+def checksum(con: Connection) -> str:
+    """SHA-256 of the schema and every row of every table (in b-tree order, which copies preserve).
+    """
+    digest = sha256()
+    tables = con.execute("SELECT type, name, sql FROM sqlite_master WHERE sql IS NOT NULL ORDER BY name").fetchall()
+    for kind, name, sql in tables:
+        digest.update(sql.encode('utf-8'))
+        if kind != 'table' or sql.upper().startswith('CREATE VIRTUAL TABLE'):
+            continue
+        cursor = con.execute(f'SELECT * FROM {quote(name)}')
+        rows = cursor.fetchmany(BATCH_SIZE)
+        while rows:
+            digest.update(repr(rows).encode('utf-8'))
+            rows = cursor.fetchmany(BATCH_SIZE)
+    return digest.hexdigest()
+
+
+def save(source: Connection, target: Connection, path: str, pages: int = PAGES,
+         progress: Optional[ProgressCallback] = None) -> str:
+    """Copy source into target (a connection to path) and return the method used ("backup" or "vacuum").
+
+    Falls back to VACUUM INTO only when the backup API failed because the page sizes of the databases cannot be
+    reconciled (target is in WAL mode) and target is empty, target has to be re-opened by the caller in that case. Any
+    other error is raised, as is FileExistsError if target has contents (nothing is ever overwritten).
+    """
+    if not is_empty(path):
+        raise FileExistsError(f'{path} is not an empty database, refusing to overwrite it')
+    try:
+        copy(source, target, pages, progress)
+        return 'backup'
+    except Error as e:
+        if not mismatched(source, target):
+            raise
+        log.warning(f'backup to {path} failed ({e}), falling back to VACUUM INTO')
+        target.close()
+        vacuum_into(source, path)
+        return 'vacuum'
+
+
+class BackgroundBackup(Thread):
+    """Backup on its own thread (and its own connections) so that the REPL stays usable.
+
+    Progress is reported as a short status string to report.
+    """
+
+    def __init__(self, source: Callable[[], Connection], target: Callable[[], Connection], path: str,
+                 pages: int = PAGES, rate: float = 0, pause: float = 0,
+                 report: Optional[Callable[[str], None]] = None):
+        super().__init__(name=f'backup to {path}', daemon=True)
+        self.path: str = path
+        self.status: str = 'starting'
+        self._source: Callable[[], Connection] = source
+        self._target: Callable[[], Connection] = target
+        self._report: Optional[Callable[[str], None]] = report
+        self._throttle = Throttle(pages, rate, pause, self._progress)
+
+    def _set_status(self, status: str) -> None:
+        self.status = status
+        if self._report is not None:
+            self._report(status)
+
+    def _progress(self, status: int, remaining: int, total: int) -> None:
+        self._set_status(f'{100 * (total - remaining) // max(total, 1)}% of {total} pages')
+
+    def run(self) -> None:
+        start: float = perf_counter()
+        source: Optional[Connection] = None
+        target: Optional[Connection] = None
+        try:
+            # opening either database can fail too (e.g. the target directory does not exist)
+            source = self._source()
+            target = self._target()
+            copy(source, target, self._throttle.pages, self._throttle)
+            self._set_status(f'done in {perf_counter() - start:.1f}s')
+        except Error as e:
+            log.warning(f'backup to {self.path} failed: {e}')
+            self._set_status(f'failed ({e})')
+        finally:
+            for con in (source, target):
+                if con is not None:
+                    con.close()
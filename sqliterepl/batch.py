@@ -0,0 +1,268 @@
+"""
+Running SQL without the prompt, for cron jobs and pipelines.
+
+Statements come from -c, -f or stdin (when it is not a terminal) and are split with sqlite3.complete_statement as
+the lines arrive, so a script is never read into memory as a whole. Meta commands (lines starting with a dot outside
+of a statement) work as they do in the REPL. Rows are written to stdout as CSV, TSV, JSON lines or tables, errors go
+to stderr and the first one (of a statement or a meta command) stops the run with exit status 1.
+
+.read runs scripts the same way, committing every few statements so that big migrations neither hold one huge
+transaction nor pay for a commit per statement.
+"""
+
+# Standard Library
+import os
+import re
+import sqlite3
+import sys
+from sqlite3 import Connection, Cursor
+from time import perf_counter
+from typing import Any, Callable, FrozenSet, Iterable, Iterator, List, Optional, Pattern, Sequence, TextIO, Tuple
+
+# Relative
+from .context import SqliteCtxt
+from .executor import POLL, Stats, run_statement
+from .meta_cmds import CommandError, command_name, dispatch
+from .render import BATCH_SIZE, print_cursor
+from .transfer import _delimited_writer, _jsonl_writer
+from .utils import log, set_stats
+
+FORMATS: Tuple[str, ...] = ('csv', 'tsv', 'jsonl', 'table')
+
+# statements that end a transaction or cannot run inside one (or, like PRAGMA foreign_keys, are ignored inside one)
+_OUTSIDE: FrozenSet[str] = frozenset({'ATTACH', 'BEGIN', 'COMMIT', 'DETACH', 'END', 'PRAGMA', 'ROLLBACK', 'VACUUM'})
+
+# first keyword of a statement, after any comments
+_FIRST_WORD: Pattern = re.compile(r'(?:\s+|--[^\n]*(?:\n|$)|/\*.*?\*/)*(\w+)', re.DOTALL)
+
+
+def _split(text: str) -> Tuple[List[str], str]:
+    """Complete statements at the start of text and whatever is left after the last one.
+    """
+    statements: List[str] = []
+    start: int = 0
+    for i, ch in enumerate(text):
+        # a ; inside a string, a comment or a trigger body does not complete the statement
+        if ch == ';' and sqlite3.complete_statement(text[start:i + 1]):
+            statement: str = text[start:i + 1].strip()
+            if statement != ';':
+                statements.append(statement)
+            start = i + 1
+    return statements, text[start:]
+
+
+def statements(lines: Iterable[str]) -> Iterator[Tuple[int, str]]:
+    """(line number, statement) for every statement and meta command in lines.
+
+    A trailing statement without a semicolon is yielded as is.
+    """
+    buffer: str = ''
+    first: int = 1
+    for n, line in enumerate(lines, 1):
+        if not buffer.strip():
+            first = n
+            if line.lstrip().startswith('.'):
+                buffer = ''
+                yield n, line.strip()
+                continue
+        buffer += line
+        if ';' in line:
+            done, buffer = _split(buffer)
+            for statement in done:
+                yield first, statement
+            # what is left starts on this line (unless the ; was inside a statement that goes on)
+            if done:
+                first = n
+    if buffer.strip():
+        yield first, buffer.strip()
+
+
+def writer(fmt: str, table_style: str = 'simple', out: Optional[TextIO] = None,
+           batch_size: int = BATCH_SIZE) -> Callable[[Cursor], int]:
+    """Render for run_statement that writes all rows of the cursor to out (stdout) in fmt (one of FORMATS).
+    """
+    def write(cursor: Cursor) -> int:
+        f: TextIO = out or sys.stdout
+        if cursor.description is None:
+            return 0
+        if fmt == 'table':
+            return print_cursor(cursor, table_style, batch_size)
+        columns: List[str] = [d[0] for d in cursor.description]
+        if fmt == 'jsonl':
+            write_rows: Callable[[List[Sequence[Any]]], None] = _jsonl_writer(f, columns)
+        else:
+            write_rows = _delimited_writer(f, columns, '\t' if fmt == 'tsv' else ',')
+        n: int = 0
+        rows: List[Sequence[Any]] = cursor.fetchmany(batch_size)
+        while rows:
+            write_rows(rows)
+            n += len(rows)
+            rows = cursor.fetchmany(batch_size)
+        return n
+
+    return write
+
+
+class _Progress:
+    """Statement n of total and the time so far (overwriting the same line of a terminal's stderr).
+    """
+
+    def __init__(self, total: int):
+        self.total: int = total
+        self.n: int = 0
+        self.start: float = perf_counter()
+        self._drawn: float = 0.0
+        self._shown: bool = False
+
+    def update(self, n: int, line: int) -> None:
+        self.n = n
+        now: float = perf_counter()
+        # redrawing for every statement of a big script would cost more than running them
+        if now - self._drawn >= POLL and sys.stderr.isatty():
+            print(f'\r\x1b[KStatement {n} of {self.total} (line {line}), {now - self.start:.1f}s...',
+                  end='', file=sys.stderr, flush=True)
+            self._drawn = now
+            self._shown = True
+
+    def clear(self) -> None:
+        if self._shown:
+            print('\r\x1b[K', end='', file=sys.stderr, flush=True)
+            self._shown = False
+
+    def done(self, ok: bool) -> None:
+        self.clear()
+        print(f'{"Ran" if ok else "Stopped at statement"} {self.n} of {self.total} statements in '
+              f'{perf_counter() - self.start:.2f}s.', file=sys.stderr)
+
+
+def _first_word(statement: str) -> str:
+    m = _FIRST_WORD.match(statement)
+    return m.group(1).upper() if m is not None else ''
+
+
+def count(lines: Iterable[str]) -> int:
+    """Number of statements and meta commands in lines.
+    """
+    return sum(1 for _ in statements(lines))
+
+
+def run_script(context: SqliteCtxt, lines: Iterable[str], fmt: str = 'csv', batch: int = 1,
+               total: Optional[int] = None) -> int:
+    """Execute every statement in lines one by one and return the exit status (0 if all of them succeeded).
+
+    Statements are committed in transactions of batch statements, unless the script manages transactions itself.
+    The first error rolls back the open transaction and stops the script. With total (the number of statements)
+    progress is reported on stderr.
+    """
+    render: Callable[[Cursor], int] = writer(fmt, context.table_style or 'simple')
+    progress: Optional[_Progress] = _Progress(total) if total is not None else None
+    # statements run in the transaction opened here, None when there is no such transaction
+    pending: Optional[int] = None
+    status: int = 1
+
+    def show(cursor: Cursor) -> int:
+        if progress is not None and cursor.description is not None:
+            progress.clear()
+        return render(cursor)
+
+    def report(stats: Stats) -> None:
+        if progress is not None and (context.timer or context.show_stats):
+            progress.clear()
+        set_stats(context, stats)
+
+    def error(line: int, n: int, message: str) -> None:
+        if progress is not None:
+            progress.clear()
+        where: str = f'line {line}' if total is None else f'line {line} (statement {n} of {total})'
+        print(f'Error near {where}: {message}', file=sys.stderr)
+
+    try:
+        for n, (line, statement) in enumerate(statements(lines), 1):
+            if progress is not None:
+                progress.update(n, line)
+            context.user_input = statement
+
+            if command_name(statement) is not None:
+                if pending is not None:
+                    # meta commands may use (or replace) the connection
+                    context.con.commit()
+                    pending = None
+                if progress is not None:
+                    progress.clear()
+                try:
+                    dispatch(context)
+                except (CommandError, sqlite3.Error) as e:
+                    error(line, n, str(e))
+                    return status
+                continue
+
+            con: Connection = context.con
+            if _first_word(statement) in _OUTSIDE:
+                if pending is not None:
+                    con.commit()
+                    pending = None
+            elif not con.in_transaction:
+                con.execute('BEGIN')
+                pending = 0
+
+            # rows of scripts are written out, not recorded for .last, .sort and .filter
+            context.last = None
+            context.last_missing = 'the last result came from a script'
+            try:
+                run_statement(con, statement, context.params or (), context.timeout, show, report)
+            except sqlite3.Error as e:
+                error(line, n, e.args[0])
+                log.debug(f'failed statement: {statement}')
+                if con.in_transaction:
+                    con.rollback()
+                    if pending is None:
+                        print('Rolled back the transaction opened by the script.', file=sys.stderr)
+                    elif pending:
+                        print(f'Rolled back {pending} statement(s) since the last commit.', file=sys.stderr)
+                pending = None
+                return status
+
+            if pending is not None:
+                pending += 1
+                if pending >= batch or not con.in_transaction:
+                    con.commit()
+                    pending = None
+
+        if pending is not None:
+            context.con.commit()
+            pending = None
+        status = 0
+    finally:
+        # Ctrl-C between statements (or a broken pipe) must not leave a transaction of ours open
+        if pending is not None and context.con.in_transaction:
+            context.con.rollback()
+        if progress is not None:
+            progress.done(status == 0)
+        sys.stdout.flush()
+
+    return status
+
+
+def run(context: SqliteCtxt, command: Optional[str] = None, file: Optional[str] = None, fmt: str = 'csv') -> int:
+    """Run the SQL in command, else in file ('-' for stdin), else on stdin and return the exit status.
+    """
+    lines: Iterable[str] = sys.stdin
+    if command is not None:
+        lines = command.splitlines(keepends=True)
+    elif file is not None and file != '-':
+        log.info(f'reading SQL from {file}')
+        try:
+            lines = open(file, encoding='utf-8')
+        except OSError as e:
+            print(f'Could not read SQL from {file}: {e.strerror}', file=sys.stderr)
+            return 1
+
+    try:
+        return run_script(context, lines, fmt)
+    except BrokenPipeError:
+        # the reader went away (e.g. | head), keep Python from complaining about the unflushed stdout on exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    finally:
+        if lines is not sys.stdin and hasattr(lines, 'close'):
+            lines.close()
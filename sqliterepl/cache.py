@@ -0,0 +1,153 @@
+"""
+Opt-in cache of query results for re-running the same (expensive) query while tweaking how it is displayed.
+
+Results are keyed on the normalised statement (tokens without comments or spacing, keywords upper-cased), the bound
+parameters and what tells whether the database changed since: PRAGMA data_version (commits by other connections),
+PRAGMA schema_version and the total changes made through this connection. A changed database simply never matches
+the old keys, which age out of the LRU order.
+
+Only read-only queries without volatile functions (random(), 'now', date() without a time value, ...) are cached.
+Rows are recorded while they are rendered into a columnar ResultSet, the least recently used results are evicted to
+stay within the byte budget and results bigger than the budget are not kept at all.
+"""
+
+# Standard Library
+from collections import OrderedDict
+from logging import Logger, getLogger
+from sqlite3 import Connection
+from typing import Any, Dict, Hashable, List, Optional, Set, Tuple
+
+# 3rd Party
+from pygments.token import Keyword, Name, String
+
+# Relative
+from .columns import ResultSet
+from .tokens import Token, lex
+
+log: Logger = getLogger()
+
+BUDGET: int = 64 * 1024 ** 2
+
+_QUERIES: Set[str] = {'SELECT', 'VALUES', 'WITH'}
+_WRITES: Set[str] = {'ALTER', 'ATTACH', 'CREATE', 'DELETE', 'DETACH', 'DROP', 'INSERT', 'PRAGMA', 'REPLACE',
+                     'UPDATE'}
+# functions (and keywords) whose result differs between runs
+_VOLATILE: Set[str] = {'CHANGES', 'CURRENT_DATE', 'CURRENT_TIME', 'CURRENT_TIMESTAMP', 'LAST_INSERT_ROWID',
+                       'RANDOM', 'RANDOMBLOB', 'TOTAL_CHANGES'}
+# date and time functions that mean "now" when called with at most this many arguments (i.e. without a time value)
+_NOW: Dict[str, int] = {'DATE': 0, 'DATETIME': 0, 'JULIANDAY': 0, 'STRFTIME': 1, 'TIME': 0, 'UNIXEPOCH': 0}
+
+
+def _arguments(tokens: List[Token], i: int) -> int:
+    """Number of arguments of the call with its opening parenthesis at tokens[i].
+    """
+    if i + 1 < len(tokens) and tokens[i + 1][2] == ')':
+        return 0
+    depth: int = 0
+    commas: int = 0
+    for _, _, value in tokens[i:]:
+        if value == '(':
+            depth += 1
+        elif value == ')':
+            depth -= 1
+            if depth == 0:
+                break
+        elif value == ',' and depth == 1:
+            commas += 1
+    return commas + 1
+
+
+def normalise(sql: str) -> Optional[str]:
+    """sql without comments and spacing (keywords upper-cased), None unless it is a query worth caching.
+    """
+    words: List[str] = []
+    tokens: List[Token] = lex(sql)
+    for i, (_, ttype, value) in enumerate(tokens):
+        if ttype in Keyword or ttype in Name:
+            upper: str = value.upper()
+            call: bool = i + 1 < len(tokens) and tokens[i + 1][2] == '('
+            # replace() is a function, REPLACE INTO is not
+            if upper in _VOLATILE or (upper in _WRITES and not call):
+                return None
+            if call and upper in _NOW and _arguments(tokens, i + 1) <= _NOW[upper]:
+                return None
+            if ttype in Keyword:
+                value = upper
+        elif ttype in String and value.strip("'").lower() == 'now':
+            return None
+        words.append(value)
+    if not words or words[0].upper() not in _QUERIES:
+        return None
+    return ' '.join(words).rstrip(' ;')
+
+
+class ResultCache:
+    """Results of queries, least recently used first, holding at most budget bytes (estimated).
+    """
+
+    def __init__(self, budget: int = BUDGET):
+        self.budget: int = budget
+        self.size: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        # result and its size
+        self._results: 'OrderedDict[Hashable, Tuple[ResultSet, int]]' = OrderedDict()
+
+    @staticmethod
+    def key(con: Connection, database: str, sql: str, params: Any = ()) -> Optional[Hashable]:
+        """Key of the result of sql with params as of now, None if sql should not be cached.
+        """
+        statement: Optional[str] = normalise(sql)
+        if statement is None:
+            return None
+        bound: Tuple[Any, ...] = tuple(sorted(params.items())) if isinstance(params, dict) else tuple(params)
+        values: Any = params.values() if isinstance(params, dict) else params
+        # e.g. date(:day) with :day bound to 'now'
+        if any(isinstance(v, str) and v.strip().lower() == 'now' for v in values):
+            return None
+        data_version: int = con.execute('PRAGMA data_version').fetchone()[0]
+        schema_version: int = con.execute('PRAGMA schema_version').fetchone()[0]
+        return database, statement, bound, data_version, schema_version, con.total_changes
+
+    def get(self, key: Hashable) -> Optional[ResultSet]:
+        result: Optional[Tuple[ResultSet, int]] = self._results.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._results.move_to_end(key)
+        return result[0]
+
+    def put(self, key: Hashable, result: ResultSet) -> None:
+        # views are never cached, the size of a result does not change once it is complete
+        result = result.base()
+        size: int = result.size
+        if size > self.budget:
+            return
+        old: Optional[Tuple[ResultSet, int]] = self._results.pop(key, None)
+        if old is not None:
+            self.size -= old[1]
+        self._results[key] = (result, size)
+        self.size += size
+        while self.size > self.budget:
+            _, (evicted, evicted_size) = self._results.popitem(last=False)
+            self.size -= evicted_size
+            log.debug(f'evicted a cached result of {len(evicted)} rows ({evicted_size} bytes)')
+
+    def clear(self) -> None:
+        self._results.clear()
+        self.size = 0
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def stats(self) -> str:
+        lookups: int = self.hits + self.misses
+        ratio: str = f'{self.hits / lookups:.0%}' if lookups else 'n/a'
+        return f'''
+Results cached:         {len(self):,}
+Size:                   {self.size / 1024 ** 2:,.1f} of {self.budget / 1024 ** 2:,.1f} MiB
+Hits:                   {self.hits:,}
+Misses:                 {self.misses:,}
+Hit ratio:              {ratio}
+        '''.strip()
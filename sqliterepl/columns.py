@@ -0,0 +1,281 @@
+"""
+Query results kept in memory column by column, for showing the last result again (sorted, filtered or in another
+table style) without re-running the query, and for the result cache.
+
+A column is an array of 64-bit integers or doubles for as long as its values allow (NULLs are remembered as a set of
+positions), it turns into a list when another type shows up, strings in it are interned so repeated values are
+stored once. Sorting and filtering make views: an array of row numbers over the same columns.
+"""
+
+# Standard Library
+from array import array
+from logging import Logger, getLogger
+from sqlite3 import Cursor
+from sys import getsizeof, intern
+from typing import Any, Callable, List, Optional, Sequence, Set, Tuple, Union
+
+log: Logger = getLogger()
+
+# how much memory the last result may take (estimated)
+BUDGET: int = 64 * 1024 ** 2
+
+OPERATORS: Tuple[str, ...] = ('=', '!=', '<', '<=', '>', '>=', '~')
+
+# a pointer in a list on top of the value itself
+_POINTER: int = 8
+
+
+def rank(value: Any) -> Tuple[int, Any]:
+    """Sort key that orders values of different types like SQLite: NULL, numbers, text, blobs.
+    """
+    if value is None:
+        return 0, 0
+    elif isinstance(value, (int, float)):
+        return 1, value
+    elif isinstance(value, str):
+        return 2, value
+    return 3, value
+
+
+def literal(text: str) -> Any:
+    """Value of an SQL-ish literal: NULL, a number or a (quoted) string.
+    """
+    if text.upper() == 'NULL':
+        return None
+    elif len(text) >= 2 and text[0] == text[-1] and text[0] in '\'"':
+        return text[1:-1]
+    for convert in (int, float):
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    return text
+
+
+class Column:
+    """Values of one column.
+    """
+
+    __slots__ = ('values', 'nulls', '_size')
+
+    def __init__(self):
+        self.values: Union[array, List[Any]] = array('q')
+        self.nulls: Set[int] = set()
+        # bytes taken by the values of a list (arrays know their size)
+        self._size: int = 0
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __getitem__(self, i: int) -> Any:
+        return None if self.nulls and i in self.nulls else self.values[i]
+
+    @property
+    def size(self) -> int:
+        if isinstance(self.values, array):
+            return self.values.itemsize * len(self.values) + _POINTER * 4 * len(self.nulls)
+        return self._size
+
+    def _to_list(self) -> None:
+        values: List[Any] = [None if i in self.nulls else v for i, v in enumerate(self.values)]
+        self.values = values
+        self.nulls = set()
+        self._size = getsizeof(values) + sum(map(getsizeof, values))
+
+    def _append(self, value: Any) -> None:
+        values = self.values
+        if isinstance(values, array):
+            if value is None:
+                self.nulls.add(len(values))
+                values.append(0)
+                return
+            elif type(value) is int and values.typecode == 'q':
+                try:
+                    values.append(value)
+                    return
+                except OverflowError:
+                    pass
+            elif type(value) is float:
+                if values.typecode == 'd':
+                    values.append(value)
+                    return
+                elif len(self.nulls) == len(values):
+                    # nothing but NULLs so far
+                    self.values = array('d', values)
+                    self.values.append(value)
+                    return
+            self._to_list()
+            values = self.values
+        if type(value) is str:
+            value = intern(value)
+        values.append(value)
+        self._size += getsizeof(value) + _POINTER
+
+    def extend(self, values: Sequence[Any]) -> None:
+        # all at once if every value fits (no NULLs, no other types), one by one otherwise, array('d', ...) would
+        # take integers as well and turn them into floats
+        if isinstance(self.values, array) and (self.values.typecode == 'q' or
+                                               all(type(v) is float for v in values)):
+            try:
+                self.values.extend(array(self.values.typecode, values))
+                return
+            except (TypeError, OverflowError):
+                pass
+        for value in values:
+            self._append(value)
+
+    def take(self, rows: Sequence[int]) -> List[Any]:
+        """Values in rows (a range or an array of row numbers).
+        """
+        if isinstance(rows, range) and rows.step == 1:
+            values: List[Any] = list(self.values[rows.start:rows.stop])
+        else:
+            get: Callable[[int], Any] = self.values.__getitem__
+            values = [get(i) for i in rows]
+        if self.nulls:
+            values = [None if i in self.nulls else v for i, v in zip(rows, values)]
+        return values
+
+
+class ResultSet:
+    """Rows of a query stored as columns, seen through order (row numbers, all rows in their order if None).
+    """
+
+    def __init__(self, description: Sequence[Sequence[Any]], columns: Optional[List[Column]] = None,
+                 order: Optional[array] = None):
+        self.description: Tuple[Tuple[Any, ...], ...] = tuple(tuple(d) for d in description)
+        self.names: List[str] = [d[0] for d in description]
+        self.columns: List[Column] = columns if columns is not None else [Column() for _ in description]
+        self.order: Optional[array] = order
+
+    @property
+    def total(self) -> int:
+        """Number of rows in the result (of which the view may show fewer).
+        """
+        return len(self.columns[0]) if self.columns else 0
+
+    def __len__(self) -> int:
+        return self.total if self.order is None else len(self.order)
+
+    @property
+    def size(self) -> int:
+        return sum(column.size for column in self.columns) + (self.order.itemsize * len(self.order)
+                                                             if self.order is not None else 0)
+
+    def extend(self, rows: Sequence[Sequence[Any]]) -> None:
+        for column, values in zip(self.columns, zip(*rows)):
+            column.extend(values)
+
+    def rows(self, start: int, stop: int) -> List[Tuple[Any, ...]]:
+        picked: Sequence[int] = range(start, min(stop, self.total)) if self.order is None else self.order[start:stop]
+        return list(zip(*(column.take(picked) for column in self.columns)))
+
+    def cursor(self) -> 'ResultCursor':
+        return ResultCursor(self)
+
+    def index(self, name: str) -> int:
+        """Position of the column called name (case-insensitive), ValueError if there is none.
+        """
+        lowered: List[str] = [n.lower() for n in self.names]
+        return lowered.index(name.lower())
+
+    def _view(self, order: Sequence[int]) -> 'ResultSet':
+        return ResultSet(self.description, self.columns, array('q', order))
+
+    def base(self) -> 'ResultSet':
+        """All rows in the order the query returned them.
+        """
+        return ResultSet(self.description, self.columns)
+
+    def sorted(self, name: str, descending: bool = False) -> 'ResultSet':
+        column: Column = self.columns[self.index(name)]
+        rows: Sequence[int] = range(self.total) if self.order is None else self.order
+        if isinstance(column.values, array) and not column.nulls:
+            key: Callable[[int], Any] = column.values.__getitem__
+        else:
+            def key(i: int) -> Tuple[int, Any]:
+                return rank(column[i])
+        return self._view(sorted(rows, key=key, reverse=descending))
+
+    def filtered(self, name: str, operator: str, value: Any) -> 'ResultSet':
+        """Rows where the column called name compares to value with operator (one of OPERATORS, ~ is contains).
+        """
+        column: Column = self.columns[self.index(name)]
+        rows: Sequence[int] = range(self.total) if self.order is None else self.order
+        if operator == '~':
+            needle: str = str(value).lower()
+            return self._view([i for i in rows if column[i] is not None and needle in str(column[i]).lower()])
+        target: Tuple[int, Any] = rank(value)
+        test: Callable[[Tuple[int, Any]], bool] = {
+            '=': target.__eq__,
+            '!=': target.__ne__,
+            '<': target.__gt__,
+            '<=': target.__ge__,
+            '>': target.__lt__,
+            '>=': target.__le__,
+        }[operator]
+        return self._view([i for i in rows if test(rank(column[i]))])
+
+
+class ResultCursor:
+    """The part of a Cursor that renderers use, over a ResultSet.
+    """
+
+    def __init__(self, result: ResultSet):
+        self.description: Tuple[Tuple[Any, ...], ...] = result.description
+        self._result: ResultSet = result
+        self._next: int = 0
+
+    def fetchmany(self, size: int = 1) -> List[Tuple[Any, ...]]:
+        start: int = self._next
+        self._next = min(start + size, len(self._result))
+        return self._result.rows(start, self._next)
+
+    def fetchall(self) -> List[Tuple[Any, ...]]:
+        return self.fetchmany(len(self._result) - self._next)
+
+    def close(self) -> None:
+        pass
+
+
+class Recorder:
+    """Wraps a Cursor and records the rows fetched through it, done gets the ResultSet once they have all been
+    fetched unless they took more than budget bytes (dropped is called instead).
+    """
+
+    def __init__(self, cursor: Cursor, budget: int, done: Callable[[ResultSet], None],
+                 dropped: Optional[Callable[[], None]] = None):
+        self.description: Tuple[Tuple[Any, ...], ...] = cursor.description
+        self._cursor: Cursor = cursor
+        self._budget: int = budget
+        self._done: Callable[[ResultSet], None] = done
+        self._dropped: Optional[Callable[[], None]] = dropped
+        self._result: Optional[ResultSet] = ResultSet(cursor.description) if cursor.description else None
+
+    def _record(self, rows: Sequence[Sequence[Any]]) -> None:
+        if self._result is None:
+            return
+        elif not rows:
+            self._done(self._result)
+            self._result = None
+            return
+        self._result.extend(rows)
+        if self._result.size > self._budget:
+            log.debug(f'result is over {self._budget} bytes, not keeping it')
+            self._result = None
+            if self._dropped is not None:
+                self._dropped()
+
+    def fetchmany(self, size: int = 1) -> List[Any]:
+        rows: List[Any] = self._cursor.fetchmany(size)
+        self._record(rows)
+        return rows
+
+    def fetchall(self) -> List[Any]:
+        rows: List[Any] = self._cursor.fetchall()
+        self._record(rows)
+        self._record([])
+        return rows
+
+    def close(self) -> None:
+        self._cursor.close()
@@ -1,44 +1,93 @@
 # Standard Library
+import re
 from functools import reduce
 from glob import iglob
+from itertools import chain
 from operator import concat
-from os import listdir, getenv
-from os.path import expanduser, isdir, isfile
-from typing import Dict, Generator, Iterable, List, Set
+from logging import Logger, getLogger
+from os import listdir, getenv, pathsep
+from os.path import expanduser, getmtime, isdir, isfile
+from threading import Thread
+from typing import Dict, Generator, Iterable, List, Optional, Pattern, Set, Tuple
 
 # 3rd Party
 from prompt_toolkit.completion import CompleteEvent, Completer, Completion, ThreadedCompleter, merge_completers
 from prompt_toolkit.document import Document
 from pygments.styles import STYLE_MAP
 
+# Relative
+from . import persist, tokens
+from .prefix import PrefixIndex
+from .schema import SchemaCache
+from .tokens import Clause, IncrementalLexer
+
+log: Logger = getLogger()
+
 
 class _MetaCmdCompleter(Completer):
     META: Dict[str, str] = {f'.{k}': (v[0], v[1] + '.') for k, v in {
+        'advise': ("<QUERY> | --history [N]",
+                   'Propose indexes for QUERY (or the last N statements in the history) and estimate the gain'),
+        'backup': ("[--pages N] [--rate PAGES_PER_SEC] [--sleep SECONDS] [--background] [FILE]",
+                   'Back up the database to FILE copying N pages per step at most PAGES_PER_SEC pages a second, '
+                   'shows the status of the background backup if FILE is not provided'),
+        'cache': ("[on [MiB]|off|stats|clear]", 'Cache results of repeated read-only queries (in at most MiB) until the '
+                                                'database changes, stats shows hits and size, clear empties it'),
         'cd': ("[DIR]", 'Change directory to DIR or $HOME if DIR is not provided'),
-        'dump': ("[FILE]", 'Stringify database into SQL commands or STDOUT if FILE is not provided'),
+        'dump': ("[--gzip|--xz] [--split DIR [--jobs N]] [FILE|-] [PATTERN ...]",
+                 'Stringify tables matching PATTERN (all tables if not provided) into SQL commands in FILE or STDOUT '
+                 'if FILE is not provided or "-", --split writes each table to its own file in DIR using N threads'),
+        'eqp': ("[on|off]", 'Show the query plan (and warn about full scans) before running each statement, shows '
+                            'current setting with no arg'),
         'exit': ("", 'Exit the REPL'),
+        'explain': ("<QUERY>", 'Show the plan of QUERY as a tree and warn about full scans of large tables'),
+        'export': ("[--gzip|--xz] <csv|tsv|jsonl|binary> <FILE> <QUERY>",
+                   'Write rows returned by QUERY to FILE (compressed with --gzip, --xz or a .gz/.xz FILE)'),
+        'filter': ("<COLUMN> <=|!=|<|<=|>|>=|~> <VALUE> | off",
+                   'Show the rows of the last result where COLUMN compares to VALUE (~ is contains) without re-running '
+                   'the query, off shows all of them again'),
         'help': ("[PATTERN]", 'Display meta commands matching PATTERN or ALL if PATTERN is not provided'),
         'mode': ("[STYLE]", 'Change table style to STYLE or display current style if STYLE is not provided'),
+        'import': ("[--csv|--tsv|--jsonl] [--batch N] [--fast] <FILE> <TABLE>",
+                   'Load rows from FILE into TABLE (created if missing), --fast turns off syncing during the load'),
+        'last': ("", 'Show the last result again (sorted and filtered, in the current table style)'),
         'log': ("[FILE|off]",
                 'Redirect (implicitly enable) logging into FILE or disable logging with "off", shows current setting with no arg'),
         'open': (
             "[DATABASE]", 'Close this database and open DATABASE or show current database if DATABASE is not provided'),
         'output': ("[FILE]", 'Redirect output of commands to FILE (or to STDOUT if FILE == "stdout"), shows current '
                              'output stream if FILE is not provided'),
+        'pager': ("[on|off]", 'Browse query results in the built-in pager, shows current setting with no arg'),
+        'param': ("<ACTION> [NAME] [VALUE]",
+                  'Bind VALUE (an SQL expression) to :NAME (also @NAME and $NAME) with ACTION set, remove it with unset, '
+                  'list or clear all bound parameters'),
         'print': ("[STRING, ...]", 'Display given STRING in the terminal'),
+        'profile': ("[default|safe|analytics|bulkload]",
+                    'Tune connections (journal mode, syncing, page cache, memory map, temp store, busy timeout) for '
+                    'a workload, shows the current settings with no arg'),
         'prompt': ("[STRING]", 'Change prompt to STRING'),
         'quit': ("", 'Exit the REPL'),
-        'read': ("[FILE]", 'Eval SQL from FILE'),
-        'save': ("<FILE>", 'Save in-memory database to FILE'),
+        'read': ("[--edit] [--batch N] <FILE>", 'Run the statements in FILE one by one (streamed, committing every N, '
+                                                 'reporting statement N of M), --edit opens a copy in $EDITOR first'),
+        'save': ("[--verify] [--pages N] <FILE>",
+                 'Save in-memory database to FILE (which must not have contents) copying N pages at a time, '
+                 '--verify compares checksums afterwards'),
         'schema': ("[PATTERN]", 'Show schemas for tables in the database matching PATTERN'),
         'shell': ("<CMD> [ARG, ...]", 'Run an OS command CMD'),
         'show': (
             "[PATTERN]", 'Display info about the REPL starting with PATTERN or all info if PATTERN is not provided'),
+        'sort': ("<COLUMN> [asc|desc]", 'Sort the last result by COLUMN without re-running the query'),
+        'stats': ("[on|off|last]", 'Report rows, VM steps and bytes read (estimate) after each statement, last shows '
+                                   'the figures of the last statement, shows current setting with no arg'),
         'style': ("[STYLE]", 'Change style to STYLE or show current style if STYLE is not provided'),
         'system': ("<CMD> [ARG, ...]", 'Run an OS command CMD with ARGS'),
         'tables': (
             "[PATTERN]", 'Show tables in the database matching PATTERN or show all tables if PATTERN is not provided'),
+        'timer': ("[on|off]", 'Report wall and CPU time after each statement, shows current setting with no arg'),
+        'timeout': ("[SECONDS|off]",
+                    'Interrupt statements running for longer than SECONDS, shows current setting with no arg'),
     }.items()}
+    INDEX: PrefixIndex = PrefixIndex((cmd, pair[1]) for cmd, pair in META.items())
 
     def get_completions(self, doc: Document, event: CompleteEvent) -> Generator[Completion, None, None]:
 
@@ -46,36 +95,30 @@ class _MetaCmdCompleter(Completer):
             return
 
         curr_word = doc.get_word_before_cursor(WORD=True)
-        curr_word_upper = curr_word.upper()
-        curr_word_lower = curr_word.lower()
         start_position, _ = doc.find_boundaries_of_current_word(WORD=True)
 
         # only complete on the *first* word starting with a dot ('.')
         if curr_word.strip() == '' or (len(doc.text.strip().split(' ')) > 1 and curr_word.strip().startswith('.')):
             return
 
-        for completion, pair in _MetaCmdCompleter.META.items():
-            syntax, descr = pair
-            if completion.startswith(curr_word_lower) or completion.startswith(curr_word_upper):
-                yield Completion(completion, start_position=start_position, display_meta=descr)
+        for completion, descr in _MetaCmdCompleter.INDEX.search(curr_word):
+            yield Completion(completion, start_position=start_position, display_meta=descr)
         return
 
 
 class _StyleCompleter(Completer):
     STYLES: Set[str] = set(STYLE_MAP.keys())
+    INDEX: PrefixIndex = PrefixIndex(PrefixIndex.of(STYLES, 'style'))
 
     def get_completions(self, doc: Document, event: CompleteEvent) -> Generator[Completion, None, None]:
 
         if (len(doc.text.strip()) == 0) or (not doc.text.strip().startswith('.style')): return
 
         curr_word = doc.get_word_before_cursor(WORD=True)
-        curr_word_upper = curr_word.upper()
-        curr_word_lower = curr_word.lower()
         start_position, _ = doc.find_boundaries_of_current_word(WORD=True)
 
-        for style in _StyleCompleter.STYLES:
-            if style.startswith(curr_word_lower) or style.startswith(curr_word_upper):
-                yield Completion(style, start_position=start_position, display_meta='style')
+        for style, meta in _StyleCompleter.INDEX.search(curr_word):
+            yield Completion(style, start_position=start_position, display_meta=meta)
 
 
 class _TableStyleCompleter(Completer):
@@ -101,36 +144,57 @@ class _TableStyleCompleter(Completer):
         "latex_booktabs",
         "textile",
     }
+    INDEX: PrefixIndex = PrefixIndex(PrefixIndex.of(STYLES, 'table style'))
 
     def get_completions(self, doc: Document, event: CompleteEvent) -> Generator[Completion, None, None]:
 
         if (len(doc.text.strip()) == 0) or (not doc.text.strip().startswith('.mode')): return
 
         curr_word = doc.get_word_before_cursor(WORD=True)
-        curr_word_upper = curr_word.upper()
-        curr_word_lower = curr_word.lower()
         start_position, _ = doc.find_boundaries_of_current_word(WORD=True)
 
-        for style in _TableStyleCompleter.STYLES:
-            if style.startswith(curr_word_lower) or style.startswith(curr_word_upper):
-                yield Completion(style, start_position=start_position, display_meta='table style')
+        for style, meta in _TableStyleCompleter.INDEX.search(curr_word):
+            yield Completion(style, start_position=start_position, display_meta=meta)
 
 
 class _ExecutablesCompleter(Completer):
-    from sys import platform
-    CACHE: Set[str] = None
-    if platform.startswith('win'):
-        CACHE = set(
-            filter(lambda x: not ('.' in x), reduce(concat, [listdir(d) for d in filter(isdir, filter(bool,
-                                                                                                      getenv(
-                                                                                                          "PATH").split(
-                                                                                                          ';')))])))
-    else:
-        CACHE = set(
-            filter(lambda x: not ('.' in x), reduce(concat, [listdir(d) for d in filter(isdir, filter(bool,
-                                                                                                      getenv(
-                                                                                                          "PATH").split(
-                                                                                                          ':')))])))
+    """Executables on PATH (from the cache file, re-scanned in the background when PATH or any of its directories
+    changed).
+    """
+    CACHE: Set[str] = set()
+    INDEX: PrefixIndex = PrefixIndex()
+    _loaded: bool = False
+
+    @staticmethod
+    def _scan(dirs: Iterable[str]) -> Set[str]:
+        return set(filter(lambda x: not ('.' in x), reduce(concat, [listdir(d) for d in dirs], [])))
+
+    @staticmethod
+    def _update(executables: Iterable[str]) -> None:
+        _ExecutablesCompleter.CACHE = set(executables)
+        _ExecutablesCompleter.INDEX = PrefixIndex(PrefixIndex.of(_ExecutablesCompleter.CACHE, 'executable'))
+
+    @staticmethod
+    def _refresh(path: str, cached: Optional[Dict]) -> None:
+        dirs: List[str] = [d for d in path.split(pathsep) if d and isdir(d)]
+        mtimes: Dict[str, float] = {d: getmtime(d) for d in dirs}
+        if cached is not None and cached.get('path') == path and cached.get('mtimes') == mtimes:
+            return
+        log.debug('re-scanning PATH for executables')
+        _ExecutablesCompleter._update(_ExecutablesCompleter._scan(dirs))
+        persist.save(persist.cache_file('executables', path),
+                     {'path': path, 'mtimes': mtimes, 'executables': sorted(_ExecutablesCompleter.CACHE)})
+
+    @staticmethod
+    def load() -> None:
+        if _ExecutablesCompleter._loaded:
+            return
+        _ExecutablesCompleter._loaded = True
+        path: str = getenv('PATH', '')
+        cached: Optional[Dict] = persist.load(persist.cache_file('executables', path))
+        if cached is not None and cached.get('path') == path:
+            _ExecutablesCompleter._update(cached['executables'])
+        Thread(target=_ExecutablesCompleter._refresh, args=(path, cached), name='executables', daemon=True).start()
 
     def get_completions(self, doc: Document, event: CompleteEvent) -> Generator[Completion, None, None]:
 
@@ -140,15 +204,15 @@ class _ExecutablesCompleter(Completer):
         pos, _ = doc.find_boundaries_of_current_word()
 
         if (doc.text.startswith('.shell') or doc.text.startswith('.system')) and len(doc.current_line.split(' ')) < 3:
-            for binary in _ExecutablesCompleter.CACHE:
-                if binary.startswith(curr_word):
-                    yield Completion(binary, start_position=pos, display_meta='executable')
+            for binary, meta in _ExecutablesCompleter.INDEX.search(curr_word, fuzzy=False):
+                yield Completion(binary, start_position=pos, display_meta=meta)
 
 
 class _FileCompleter(Completer):
     def get_completions(self, doc: Document, event: CompleteEvent) -> Generator[Completion, None, None]:
         if (len(doc.current_line.strip()) == 0) or \
                 ((not (doc.text.strip().startswith('.dump'))) and
+                 (not doc.text.strip().startswith('.import')) and
                  (not doc.text.strip().startswith('.read')) and
                  (not doc.text.strip().startswith('.open')) and
                  (not doc.text.strip().startswith('.log')) and
@@ -543,37 +607,112 @@ class _SQLCompleter(Completer):
         'UNSIGNED BIG INT',
     ]
 
+    KEYWORD_INDEX: PrefixIndex = PrefixIndex(PrefixIndex.of(KEYWORDS, "keyword"))
+    PRAGMA_INDEX: PrefixIndex = PrefixIndex(PrefixIndex.of(PRAGMAS, "pragma"))
+    TABLE_INDEX: PrefixIndex = PrefixIndex(chain(
+        PrefixIndex.of(TABLES, "table"),
+        PrefixIndex.of([f'pragma_{i}(' for i in PRAGMAS], "pragma function"),
+    ))
+    FUNCTION_INDEX: PrefixIndex = PrefixIndex(chain(
+        PrefixIndex.of(AGGR_FUNCTS, "aggregate function"),
+        PrefixIndex.of(FUNCTS, "function"),
+    ))
+    INDEX: PrefixIndex = PrefixIndex(chain(
+        PrefixIndex.of(PRAGMAS, "pragma"),
+        PrefixIndex.of([f'pragma_{i}(' for i in PRAGMAS], "pragma function"),
+        PrefixIndex.of(AGGR_FUNCTS, "aggregate function"),
+        PrefixIndex.of(KEYWORDS, "keyword"),
+        PrefixIndex.of(TABLES, "table"),
+        PrefixIndex.of(FUNCTS, "function"),
+        PrefixIndex.of(DTYPES, "data type"),
+        PrefixIndex.of(NUMERIC, "NUMERIC (alias)"),
+        PrefixIndex.of(TEXT, "TEXT (alias)"),
+        PrefixIndex.of(REAL, "REAL (alias)"),
+        PrefixIndex.of(INTEGER, "INTEGER (alias)"),
+    ))
+    WORD: Pattern = re.compile(r'[\w$.]*$')
+    # candidates offered before anything is typed (when every one of them matches)
+    EMPTY_WORD_LIMIT: int = 100
+
+    def __init__(self, schema: Optional[SchemaCache] = None):
+        self.schema: Optional[SchemaCache] = schema
+        self.lexer: IncrementalLexer = IncrementalLexer()
+
+    def _qualified(self, clause: Clause, word: str) -> List[Tuple[str, str]]:
+        """Columns of the table (or alias) or tables of the database before the dot.
+        """
+        if self.schema is None:
+            return []
+        table: str = clause.aliases.get(clause.qualifier, clause.qualifier)
+        if table in self.schema.columns:
+            return [(c, f'column of {table}') for c in self.schema.columns[table]
+                    if c.casefold().startswith(word.casefold())]
+        elif clause.qualifier in {'main', 'temp'}:
+            return [(t, m) for t, m in self.schema.table_index.prefix(word) if m == 'table' and '.' not in t]
+        elif clause.qualifier in self.schema.schemas:
+            return [(t.split('.', 1)[1], m) for t, m in self.schema.table_index.prefix(f'{clause.qualifier}.{word}')]
+        return []
+
+    def _sources(self, clause: Clause) -> List[PrefixIndex]:
+        """Candidates that make sense in clause, most relevant first.
+        """
+        schema: List[PrefixIndex] = [] if self.schema is None else [self.schema.table_index, self.schema.column_index]
+        if clause.kind == tokens.NONE:
+            return []
+        elif clause.kind == tokens.KEYWORD:
+            return [_SQLCompleter.KEYWORD_INDEX]
+        elif clause.kind == tokens.PRAGMA:
+            return [_SQLCompleter.PRAGMA_INDEX]
+        elif clause.kind == tokens.TABLE:
+            return schema[:1] + [_SQLCompleter.TABLE_INDEX]
+        elif clause.kind == tokens.EXPRESSION:
+            return schema[1:] + [_SQLCompleter.FUNCTION_INDEX, _SQLCompleter.KEYWORD_INDEX] + schema[:1]
+        return schema + [_SQLCompleter.INDEX]
+
     def get_completions(self, doc: Document, event: CompleteEvent) -> Generator[Completion, None, None]:
 
         if len(doc.current_line.strip()) == 0 or doc.text.strip().startswith('.'):
             return
 
-        word = doc.get_word_before_cursor(WORD=True)
-        word_upper = word.upper()
-        word_lower = word.lower()
-        pos = doc.find_boundaries_of_current_word(WORD=True)[0]
-
-        def matches(completion: str) -> bool:
-            return completion.startswith(word_lower) or completion.startswith(word_upper)
-
-        def from_iter(words: Iterable[str], meta_info: str) -> Generator[Completion, None, None]:
-            for w in filter(matches, words):
-                yield Completion(w, start_position=pos, display_meta=meta_info)
-
-        yield from from_iter(_SQLCompleter.PRAGMAS, "pragma")
-        yield from from_iter([f'pragma_{i}(' for i in _SQLCompleter.PRAGMAS], "pragma function")
-        yield from from_iter(_SQLCompleter.AGGR_FUNCTS, "aggregate function")
-        yield from from_iter(_SQLCompleter.KEYWORDS, "keyword")
-        yield from from_iter(_SQLCompleter.TABLES, "table")
-        yield from from_iter(_SQLCompleter.FUNCTS, "function")
-        yield from from_iter(_SQLCompleter.DTYPES, "data type")
-        yield from from_iter(_SQLCompleter.NUMERIC, "NUMERIC (alias)")
-        yield from from_iter(_SQLCompleter.TEXT, "TEXT (alias)")
-        yield from from_iter(_SQLCompleter.REAL, "REAL (alias)")
-        yield from from_iter(_SQLCompleter.INTEGER, "INTEGER (alias)")
-
-
-def SQLiteCompleter() -> Completer:
+        word: str = _SQLCompleter.WORD.search(doc.text_before_cursor).group()
+        clause: Clause = tokens.clause_at(self.lexer.tokenize(doc.text), doc.cursor_position, word)
+
+        if clause.qualifier is not None:
+            word = word.rsplit('.', 1)[1]
+            matches: List[Tuple[str, str]] = self._qualified(clause, word)
+
+        else:
+            sources: List[PrefixIndex] = self._sources(clause)
+            matches = []
+
+            # columns of tables used in the statement come first
+            if clause.kind == tokens.EXPRESSION and self.schema is not None:
+                for table in set(clause.aliases.values()):
+                    matches += [(c, f'column of {table}') for c in self.schema.columns.get(table, [])
+                                if c.casefold().startswith(word.casefold())]
+
+            if word:
+                for index in sources:
+                    matches += index.prefix(word)
+            else:
+                # the most relevant candidates only, without copying all of them
+                del matches[_SQLCompleter.EMPTY_WORD_LIMIT:]
+                for index in sources:
+                    matches += index.prefix(word, _SQLCompleter.EMPTY_WORD_LIMIT - len(matches))
+
+            if not matches and len(word) > 1:
+                for index in sources:
+                    matches += index.fuzzy(word)
+
+        seen: Set[str] = set()
+        for w, meta_info in matches:
+            if w not in seen:
+                seen.add(w)
+                yield Completion(w, start_position=-len(word), display_meta=meta_info)
+
+
+def SQLiteCompleter(schema: Optional[SchemaCache] = None) -> Completer:
+    _ExecutablesCompleter.load()
     return ThreadedCompleter(
         merge_completers([
             _MetaCmdCompleter(),
@@ -583,5 +722,5 @@ def SQLiteCompleter() -> Completer:
             _FileCompleter(),
             _StyleCompleter(),
             _CdCompleter(),
-            _SQLCompleter(),
+            _SQLCompleter(schema),
         ]))
@@ -1,30 +1,56 @@
 from argparse import Namespace
-from functools import reduce
 from os.path import expanduser
 from sqlite3 import Connection
-from typing import Any, Optional, Dict
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, Tuple
 
-from prompt_toolkit import PromptSession
+if TYPE_CHECKING:
+    from prompt_toolkit import PromptSession
 
+    from .cache import ResultCache
+    from .columns import ResultSet
 
-class Context(dict):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, *kwargs)
 
-    def __getattr__(self, item: str) -> Optional[Any]:
-        return eval(f'self["{item}"]', globals(), locals()) if item in self.keys() else None
+class Context:
+    """Settings and state as plain attributes, declared (through annotations) in the __slots__ of subclasses.
+
+    Attributes start as None. Assigning a different value calls the listeners with the name of the attribute so that
+    whatever shows settings (the toolbar, the prompt) is only rebuilt when one of them actually changed.
+    """
+
+    __slots__ = ('_listeners',)
+
+    def __init__(self, **kwargs):
+        object.__setattr__(self, '_listeners', {})
+        for name in self.fields():
+            object.__setattr__(self, name, None)
+        for k, v in kwargs.items():
+            setattr(self, k, v)
+
+    @classmethod
+    def fields(cls) -> Tuple[str, ...]:
+        return tuple(name for c in reversed(cls.__mro__) for name in getattr(c, '__slots__', ())
+                     if not name.startswith('_'))
 
     def __setattr__(self, key: str, value: Any) -> None:
-        self[key] = value
+        old: Any = getattr(self, key, None)
+        object.__setattr__(self, key, value)
+        if old is not value and old != value:
+            for listener in self._listeners.values():
+                listener(key)
+
+    def subscribe(self, name: str, listener: Callable[[str], None]) -> None:
+        """Call listener with the name of every attribute that changes (replaces the listener registered as name).
+        """
+        self._listeners[name] = listener
 
     def __str__(self):
         s: str = self.__class__.__name__
         s += '\n' + (len(s) * '-')
 
-        size: int = len(reduce(lambda k1, k2: k1 if len(k2) <= len(k1) else k2, self.keys()))
+        size: int = max(map(len, self.fields()))
 
-        for k, v in self.items():
-            s += f'  %-{size + 2}s %s\n' % (k, str(v))
+        for k in self.fields():
+            s += f'  %-{size + 2}s %s\n' % (k, str(getattr(self, k)))
 
         s += '\n'
 
@@ -33,40 +59,61 @@ class Context(dict):
     def __repr__(self):
         return str(self)
 
-    @staticmethod
-    def from_namespace(namespace: Namespace) -> Dict[str, Any]:
-        context = Context()
+    @classmethod
+    def from_namespace(cls, namespace: Namespace) -> 'Context':
+        context = cls()
         for k, v in vars(namespace).items():
-            context[k] = expanduser(v) if isinstance(v, str) and '~' in v else v
+            setattr(context, k, expanduser(v) if isinstance(v, str) and '~' in v else v)
         return context
 
 
 class SqliteCtxt(Context):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, *kwargs)
-        self.BROWSER: str = None
-        self.CDPATH: str = None
-        self.EDITOR: str = None
-        self.HOME: str = None
-        self.LANG: str = None
-        self.LC_ALL: str = None
-        self.PAGER: str = None
-        self.PATH: str = None
-        self.PWD: str = None
-        self.complete_while_typing: bool = None
-        self.con: Connection = None
-        self.database: str = None
-        self.editor: bool = None
-        self.eval: str = None
-        self.history: str = None
-        self.history_search: bool = None
-        self.infobar: bool = None
-        self.memory: bool = None
-        self.multiline: bool = None
-        self.prompt: str = None
-        self.prompt_session: PromptSession = None
-        self.readonly: bool = None
-        self.style: Any = None
-        self.table_style: str = None
-        self.user_input: str = None
-        self.verbose: bool = None
+    BROWSER: Optional[str]
+    CDPATH: Optional[str]
+    EDITOR: Optional[str]
+    HOME: Optional[str]
+    LANG: Optional[str]
+    LC_ALL: Optional[str]
+    PAGER: Optional[str]
+    PATH: Optional[str]
+    PWD: Optional[str]
+    USER: Optional[str]
+    backup_job: Any
+    backup_status: Optional[str]
+    cache: Optional['ResultCache']
+    cache_size: Optional[float]
+    cached_statements: Optional[int]
+    command: Optional[str]
+    complete_while_typing: Optional[bool]
+    con: Optional[Connection]
+    database: Optional[str]
+    editor: Optional[bool]
+    eqp: Optional[bool]
+    eval: Optional[str]
+    file: Optional[str]
+    format: Optional[str]
+    history: Optional[str]
+    history_search: Optional[bool]
+    infobar: Optional[bool]
+    last: Optional['ResultSet']
+    # why the last statement left no result for .last, .sort and .filter (e.g. it was too large)
+    last_missing: Optional[str]
+    memory: Optional[bool]
+    multiline: Optional[bool]
+    pager: Optional[bool]
+    params: Optional[Dict[str, Any]]
+    profile: Optional[str]
+    prompt: Optional[str]
+    prompt_session: Optional['PromptSession']
+    readonly: Optional[bool]
+    schema: Any
+    show_stats: Optional[bool]
+    stats: Any
+    style: Any
+    table_style: Optional[str]
+    timeout: Optional[float]
+    timer: Optional[bool]
+    user_input: Optional[str]
+    verbose: Optional[bool]
+
+    __slots__ = tuple(__annotations__)
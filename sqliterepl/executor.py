@@ -0,0 +1,191 @@
+"""
+Running statements on a worker thread so that the prompt thread stays free to cancel them.
+
+While a statement runs the prompt thread waits for it in short slices. Ctrl-C (or running past the timeout) calls
+Connection.interrupt() which makes SQLite abort the statement at the next opportunity, the worker then fails with
+"interrupted" and the REPL carries on. A progress handler counts VM steps for the indicator shown on stderr while
+the statement has not produced its first row.
+
+Every statement also collects Stats: wall and CPU time, rows returned and changed, VM steps and the bytes the process
+read meanwhile. Python does not expose sqlite3_db_status (page cache hits and misses), the bytes read are only an
+estimate: they include whatever else the process read (history, stdin, background backups) and miss reads through
+memory-mapped I/O (mmap_size) altogether.
+"""
+
+# Standard Library
+import os
+import sys
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+from logging import Logger, getLogger
+from sqlite3 import Connection, Cursor, OperationalError
+from time import perf_counter
+from typing import Any, Callable, NamedTuple, Optional, TypeVar
+
+log: Logger = getLogger()
+
+T = TypeVar('T')
+
+# VM instructions between calls of the progress handler
+STEPS: int = 1000
+# how often the prompt thread wakes up to check on the statement (seconds)
+POLL: float = 0.1
+# how long a statement has to run before the indicator is shown (seconds)
+INDICATOR_DELAY: float = 1.0
+
+_worker: Optional[ThreadPoolExecutor] = None
+
+
+def bytes_read() -> Optional[int]:
+    """Bytes read by the process so far (including reads served from the OS cache), None where it is not known.
+    """
+    try:
+        with open('/proc/self/io') as f:
+            for line in f:
+                if line.startswith('rchar:'):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+class Stats(NamedTuple):
+    real: float
+    user: float
+    sys: float
+    # None when the rows were not all fetched (e.g. they went to the pager)
+    rows: Optional[int]
+    changes: int
+    steps: int
+    # by the whole process (estimate)
+    read: Optional[int]
+
+    def timer(self) -> str:
+        return f'Run Time: real {self.real:.3f} user {self.user:.6f} sys {self.sys:.6f}'
+
+    def report(self) -> str:
+        def fmt(n: Optional[int]) -> str:
+            return 'n/a' if n is None else f'{n:,}'
+
+        return f'''
+Rows returned:          {fmt(self.rows)}
+Rows changed:           {fmt(self.changes)}
+VM steps:               ~{fmt(self.steps)}
+Bytes read (process):   ~{fmt(self.read)}
+    '''.strip()
+
+    def summary(self) -> str:
+        rows: str = '' if self.rows is None else f', {self.rows:,} rows'
+        return f'{self.real:.3f}s{rows}, ~{self.steps:,} steps'
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _worker
+    if _worker is None:
+        # one worker, statements on a connection run one at a time anyway
+        _worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix='query')
+    return _worker
+
+
+class Job:
+    """A statement running on the worker thread.
+    """
+
+    def __init__(self, con: Connection, timeout: Optional[float] = None):
+        self.con: Connection = con
+        self.timeout: Optional[float] = timeout
+        self.steps: int = 0
+        self.start: float = perf_counter()
+        # set when the job was interrupted, to "cancelled" or "timed out"
+        self.reason: Optional[str] = None
+        self._shown: bool = False
+        self._times: os.times_result = os.times()
+        self._read: Optional[int] = bytes_read()
+        self._changes: int = con.total_changes
+
+    @property
+    def elapsed(self) -> float:
+        return perf_counter() - self.start
+
+    def _progress(self) -> int:
+        self.steps += STEPS
+        return 0
+
+    def interrupt(self, reason: str) -> None:
+        if self.reason is None:
+            log.info(f'interrupting statement ({reason} after {self.elapsed:.1f}s)')
+            self.reason = reason
+        self.con.interrupt()
+
+    def _indicator(self) -> None:
+        if self.elapsed >= INDICATOR_DELAY and sys.stderr.isatty():
+            print(f'\r\x1b[KRunning for {self.elapsed:.1f}s, {self.steps:,} VM steps (Ctrl-C to cancel)...',
+                  end='', file=sys.stderr, flush=True)
+            self._shown = True
+
+    def _clear(self) -> None:
+        if self._shown:
+            print('\r\x1b[K', end='', file=sys.stderr, flush=True)
+            self._shown = False
+
+    def run(self, fn: Callable[[], T], indicator: bool = True) -> T:
+        """Run fn on the worker thread and wait for it (interrupting it on Ctrl-C or past the timeout).
+        """
+        future: Future = _executor().submit(fn)
+        try:
+            while True:
+                try:
+                    return future.result(POLL)
+                except TimeoutError:
+                    if self.timeout and self.elapsed > self.timeout:
+                        self.interrupt('timed out')
+                    elif indicator:
+                        self._indicator()
+                except KeyboardInterrupt:
+                    self.interrupt('cancelled')
+        except OperationalError as e:
+            if self.reason is not None:
+                raise OperationalError(f'{self.reason} after {self.elapsed:.1f}s') from e
+            raise
+        finally:
+            self._clear()
+
+    def stats(self, rows: Optional[int]) -> Stats:
+        times: os.times_result = os.times()
+        read: Optional[int] = bytes_read()
+        if read is not None and self._read is not None:
+            read -= self._read
+        else:
+            read = None
+        return Stats(self.elapsed, times.user - self._times.user, times.system - self._times.system, rows,
+                     self.con.total_changes - self._changes, self.steps, read)
+
+    def __enter__(self) -> 'Job':
+        self.con.set_progress_handler(self._progress, STEPS)
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.con.set_progress_handler(None, STEPS)
+
+
+def run_statement(con: Connection, sql: str, params: Any = (), timeout: Optional[float] = None,
+                  render: Optional[Callable[[Cursor], Optional[int]]] = None,
+                  report: Optional[Callable[[Stats], None]] = None) -> Any:
+    """Execute sql on con and pass the cursor to render (which returns the number of rows), both on the worker thread.
+
+    Returns whatever render returns (the cursor if there is no render), report gets the Stats of the statement.
+    """
+    with Job(con, timeout) as job:
+        cursor: Cursor = con.cursor()
+        job.run(lambda: cursor.execute(sql, params))
+        if render is None:
+            if report is not None:
+                report(job.stats(None))
+            return cursor
+        try:
+            # rows are printed as they are fetched so that is progress enough
+            rows: Optional[int] = job.run(lambda: render(cursor), indicator=False)
+        finally:
+            cursor.close()
+        if report is not None:
+            report(job.stats(rows))
+        return rows
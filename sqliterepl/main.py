@@ -2,18 +2,39 @@
 # -*- coding: utf-8 -*-
 
 import sqlite3
+import sys
 # Standard Library
-from argparse import ArgumentParser, Namespace
+from argparse import ArgumentParser, ArgumentTypeError, Namespace
 from sqlite3 import Cursor
+from typing import Hashable, Optional
 
-# 3rd Party
-from pygments.styles import STYLE_MAP
-from tabulate import tabulate
-
-from .context import Context, SqliteCtxt
+from . import batch
+from .cache import ResultCache
+from .columns import ResultSet
+from .context import SqliteCtxt
 # Relative
-from .meta_cmds import meta_cmds
-from .utils import set_db_con, log, set_prompt_sess, set_toolbar, set_env_vars, set_verbosity
+from .executor import run_statement
+from .meta_cmds import CommandError, dispatch
+from .plan import print_plan
+from .profiles import PROFILES
+from .render import print_cursor
+from .utils import eval_sql_script, record, set_db_con, log, set_prompt_sess, set_schema_cache, set_stats, \
+    set_env_vars, set_verbosity
+
+
+def pygments_style(name: str) -> str:
+    """Check that name is a pygments style (without importing every style up front for argparse choices).
+    """
+    if name == 'default':
+        # argparse checks the default as well, no need to load pygments for that
+        return name
+    from pygments.styles import get_style_by_name
+    from pygments.util import ClassNotFound
+    try:
+        get_style_by_name(name)
+    except ClassNotFound:
+        raise ArgumentTypeError(f'unknown style {name!r} (see http://pygments.org/docs/styles/#builtin-styles)')
+    return name
 
 
 def main() -> None:
@@ -44,6 +65,26 @@ def main() -> None:
         nargs='?',
         help='eval SQL script before running the REPL')
 
+    parser.add_argument(
+        '-c',
+        '--command',
+        metavar='SQL',
+        help='run SQL (and meta commands) and exit, without the REPL',
+        default=None)
+
+    parser.add_argument(
+        '-f',
+        '--file',
+        metavar='FILE',
+        help='run the SQL script in FILE ("-" for stdin) and exit, the default when stdin is not a terminal',
+        default=None)
+
+    parser.add_argument(
+        '--format',
+        help='how -c, -f and piped SQL write rows to stdout (table uses --table_style)',
+        choices=list(batch.FORMATS),
+        default='csv')
+
     parser.add_argument(
         '-m',
         '--multiline',
@@ -86,6 +127,41 @@ def main() -> None:
         action='store_false',
         default=True)
 
+    parser.add_argument(
+        '-P',
+        '--pager',
+        help='browse query results in the built-in pager',
+        action='store_true',
+        default=False)
+
+    parser.add_argument(
+        '--cached-statements',
+        metavar='N',
+        help='number of prepared statements to keep cached per connection',
+        type=int,
+        default=128)
+
+    parser.add_argument(
+        '--cache',
+        dest='cache_size',
+        metavar='MiB',
+        help='cache results of repeated read-only queries in up to MiB of memory (see .cache)',
+        type=float,
+        default=None)
+
+    parser.add_argument(
+        '--profile',
+        help='tune connections for a workload (see .profile)',
+        choices=list(PROFILES.keys()),
+        default='default')
+
+    parser.add_argument(
+        '--timeout',
+        metavar='SECONDS',
+        help='interrupt statements that run for longer than SECONDS',
+        type=float,
+        default=None)
+
     parser.add_argument(
         '--readonly',
         help='open the database is READ-ONLY mode',
@@ -131,7 +207,7 @@ def main() -> None:
         '--style',
         metavar='STYLE',
         help='pygments style (see http://pygments.org/docs/styles/#builtin-styles)',
-        choices=list(STYLE_MAP.keys()),
+        type=pygments_style,
         default='default')
 
     parser.add_argument(
@@ -143,40 +219,87 @@ def main() -> None:
 
     args: Namespace = parser.parse_args()
 
-    context: SqliteCtxt = Context.from_namespace(args)
+    context: SqliteCtxt = SqliteCtxt.from_namespace(args)
 
     set_verbosity(context)
     set_db_con(context)
-    set_prompt_sess(context)
     set_env_vars(context)
 
+    if context.cache_size:
+        context.cache = ResultCache(int(context.cache_size * 1024 ** 2))
+
+    if context.command is not None or context.file is not None or not sys.stdin.isatty():
+        # batch mode, no prompt, no completions (so no schema cache) and no pygments
+        status: int = eval_sql_script(context)
+        if status == 0:
+            status = batch.run(context, context.command, context.file, context.format)
+        context.con.close()
+        sys.exit(status)
+
+    set_schema_cache(context)
+    set_prompt_sess(context)
+    eval_sql_script(context)
+
+    # the pager is built on the same parts of prompt_toolkit as the prompt, no point importing it any earlier
+    from .pager import is_query, page_cursor
+
     while True:
         try:
             log.debug(context)
-            # refreshes it so that it displays up-to-date info
-            set_toolbar(context)
+            # cheap unless the schema changed since the last statement
+            set_schema_cache(context)
             context.user_input = context.prompt_session.prompt().strip()
-            fired = False
 
-            for cmd in meta_cmds:
-                if cmd.test(context.user_input):
-                    cmd.fire(context)
-                    fired = True
-                    break
+            try:
+                is_command: bool = dispatch(context)
+            except CommandError as e:
+                print(e)
+                continue
 
-            if fired:
+            if is_command:
                 continue
 
             elif context.user_input:
+                # .last, .sort and .filter must not act on the rows of an earlier statement
+                context.last = None
+                context.last_missing = None
                 try:
                     with context.con as c:
-                        cursor: Cursor = c.cursor()
-                        cursor.execute(context.user_input)
-                        print(tabulate(cursor.fetchall(), tablefmt=context.table_style))
-                        cursor.close()
+                        params = context.params or ()
+                        if context.eqp:
+                            try:
+                                print_plan(c, context.user_input, params)
+                            except sqlite3.Error as e:
+                                # the statement itself will report it
+                                log.debug(f'no query plan: {e}')
+                        if context.pager and sys.stdout.isatty() and is_query(context.user_input):
+                            cursor: Cursor = run_statement(c, context.user_input, params, context.timeout,
+                                                           report=lambda stats: set_stats(context, stats))
+                            if cursor.description:
+                                context.last_missing = 'the last result was shown in the pager'
+                                page_cursor(cursor, lambda: c.execute(context.user_input, params))
+                            cursor.close()
+                        else:
+                            key: Optional[Hashable] = None
+                            if context.cache is not None:
+                                key = context.cache.key(c, context.database, context.user_input, params)
+                            cached: Optional[ResultSet] = context.cache.get(key) if key is not None else None
+                            if cached is not None:
+                                log.info('showing the cached result')
+                                context.last = cached
+                                print_cursor(cached.cursor(), context.table_style)
+                            else:
+                                run_statement(c, context.user_input, params, context.timeout,
+                                              lambda cursor: print_cursor(record(context, cursor, key),
+                                                                          context.table_style),
+                                              lambda stats: set_stats(context, stats))
 
                 except (sqlite3.Error, sqlite3.IntegrityError) as e:
                     print(f"An error occurred: {e.args[0]}")
 
-        except (EOFError, KeyboardInterrupt):
+        except KeyboardInterrupt:
+            # Ctrl-C discards the line (and cancels running statements), Ctrl-D exits
+            continue
+
+        except EOFError:
             break
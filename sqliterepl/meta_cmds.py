@@ -4,23 +4,31 @@ but not the same way as implemented in the official sqlite3 client.
 """
 
 # Standard Library
+import csv
 import sqlite3
 import sys
 from os import getcwd, getenv, remove
-from os.path import abspath, expanduser, isfile
+from os.path import abspath, expanduser, isdir, isfile
 from shlex import split
+from shutil import copyfileobj
 from sqlite3 import Cursor
 from subprocess import PIPE, run
 from tempfile import NamedTemporaryFile
-from typing import Any, Dict, List, Optional
-
-# 3rd Party
-from tabulate import tabulate
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional
 
 # Relative Imports
+from . import advisor, backup, cache, columns, plan, profiles, transfer
 from .context import SqliteCtxt
-from .completions import _MetaCmdCompleter
-from .utils import log, set_prompt_sess
+from .render import print_cursor, tabulate
+from .utils import connect, log, read_only, set_prompt_sess
+
+if TYPE_CHECKING:
+    from prompt_toolkit import PromptSession
+
+
+class CommandError(Exception):
+    """A meta command failed, the message says why (printed by the REPL, reported as an error by scripts).
+    """
 
 
 class MetaCmd:
@@ -30,12 +38,7 @@ class MetaCmd:
     def test(self, cmdline: str) -> bool:
         """Check if this command matches the text inserted on the cmdline.
         """
-        cmdline = cmdline.strip()
-        for pat in self.patterns:
-            if cmdline.startswith(pat):
-                log.debug(f'running {pat} meta command')
-                return True
-        return False
+        return command_name(cmdline) in self.patterns
 
     def fire(self, context: SqliteCtxt) -> None:
         """To be overridden by implementors.
@@ -45,13 +48,12 @@ class MetaCmd:
     def sanitise(self, cmdline: str) -> str:
         """Remove spaces and the command itself from the cmdline and return the result.
         """
-        cmdline = cmdline.strip()
-        if len(cmdline) == 0:
+        words: List[str] = cmdline.strip().split(maxsplit=1)
+        if not words:
             return ''
-        for pat in self.patterns:
-            if cmdline.startswith(pat):
-                return cmdline.replace(pat, '').strip()
-        return cmdline
+        elif words[0] in self.patterns:
+            return words[1] if len(words) > 1 else ''
+        return cmdline.strip()
 
     @property
     def patterns(self) -> List[str]:
@@ -60,6 +62,16 @@ class MetaCmd:
         return self._patterns
 
 
+def command_name(cmdline: str) -> Optional[str]:
+    """The first word of cmdline if it is a meta command (starts with a dot), None for SQL.
+    """
+    cmdline = cmdline.lstrip()
+    if not cmdline.startswith('.'):
+        return None
+    # meta commands are one line, splitting it is cheap
+    return cmdline.split(maxsplit=1)[0]
+
+
 class ExitCmd(MetaCmd):
     def __init__(self):
         super().__init__(".exit", ".quit")
@@ -70,20 +82,23 @@ class ExitCmd(MetaCmd):
 
 
 class HelpCmd(MetaCmd):
-    HELP_MSG: str = '\n'.join(
-        ["%10s %-17s %s" % (cmd, pair[0], pair[1]) for cmd, pair in _MetaCmdCompleter.META.items()])
-
     def __init__(self):
         super().__init__(".help")
 
+    @staticmethod
+    def _help_msg() -> str:
+        # the descriptions live with the completer which needs prompt_toolkit
+        from .completions import _MetaCmdCompleter
+        return '\n'.join(["%10s %-17s %s" % (cmd, pair[0], pair[1]) for cmd, pair in _MetaCmdCompleter.META.items()])
+
     def fire(self, context: SqliteCtxt) -> None:
         pattern: str = self.sanitise(context.user_input)
         if not pattern:
             log.debug('displaying all help')
-            print(HelpCmd.HELP_MSG)
+            print(HelpCmd._help_msg())
         else:
             log.info(f'displaying help for {pattern}')
-            for line in HelpCmd.HELP_MSG.splitlines():
+            for line in HelpCmd._help_msg().splitlines():
                 if pattern.lower() in line.lower():
                     print(line)
 
@@ -118,32 +133,68 @@ class StyleCmd(MetaCmd):
         if not new_style:
             print(f'Current style is {context.style}.')
         else:
+            from pygments.styles import get_style_by_name
+            from pygments.util import ClassNotFound
+            try:
+                get_style_by_name(new_style)
+            except ClassNotFound:
+                raise CommandError(f'Unknown style {new_style}.')
             log.info(f'changing style from {context.style} to {new_style}')
+            # the prompt session follows the context
             context.style = new_style
-            set_prompt_sess(context)
 
 
 class SaveCmd(MetaCmd):
+    SYNTAX: str = 'Syntax: .save [--verify] [--pages N] <PATH>'
+
     def __init__(self):
         super().__init__(".save")
 
     def fire(self, context: SqliteCtxt) -> None:
-        dest: str = self.sanitise(context.user_input)
-        if not dest:
-            print('Missing destination file name.')
-            print(f'Syntax: .save <PATH>')
+        args: List[str] = split(self.sanitise(context.user_input))
+        verify: bool = '--verify' in args
+        args = [arg for arg in args if arg != '--verify']
+        pages: int = backup.PAGES
+
+        try:
+            if '--pages' in args:
+                i: int = args.index('--pages')
+                pages = int(args[i + 1])
+                del args[i:i + 2]
+        except (IndexError, ValueError):
+            args = []
+
+        if len(args) != 1:
+            raise CommandError(f'Missing destination file name.\n{SaveCmd.SYNTAX}')
         elif context.database == ':memory:':
-            log.info(f'saving database in  {dest}')
-            sql: str = "\n".join(context.con.iterdump())
-            context.database = expanduser(dest)
-            context.con = sqlite3.connect(context.database)
-            with context.con as c:
-                cursor: Cursor = c.cursor()
-                cursor.executescript(sql)
-                cursor.close()
-            print(f"Saved database to {dest}.")
+            dest: str = expanduser(args[0])
+            log.info(f'saving database in {dest} ({pages} pages per step)')
+            source: sqlite3.Connection = context.con
+            target: Optional[sqlite3.Connection] = None
+            try:
+                target = connect(context, dest)
+                method: str = backup.save(source, target, dest, pages, backup.print_progress)
+            except (sqlite3.Error, OSError) as e:
+                if target is not None:
+                    target.close()
+                raise CommandError(f'Could not save database to {dest}: {e}')
+            if method == 'vacuum':
+                target = connect(context, dest)
+
+            if verify:
+                log.info(f'verifying {dest}')
+                if backup.checksum(source) != backup.checksum(target):
+                    target.close()
+                    raise CommandError(f'Verification failed, {dest} differs from the in-memory database '
+                                       f'(still using it).')
+                print('Verified checksums.')
+
+            source.close()
+            context.database = dest
+            context.con = target
+            print(f"Saved database to {dest}{' (VACUUM INTO)' if method == 'vacuum' else ''}.")
         elif context.database != ':memory:':
-            print(f'You need to have a database in memory for it to work.')
+            raise CommandError('You need to have a database in memory for it to work.')
 
 
 class TablesCmd(MetaCmd):
@@ -173,11 +224,15 @@ class ShowCmd(MetaCmd):
 
     @staticmethod
     def _docstring(context: SqliteCtxt) -> str:
-        return f'''
+        doc: str = f'''
 SQLite
 --------
 sqlite                  {sqlite3.sqlite_version}
 database                {context.database}
+cached statements       {context.cached_statements}
+profile                 {context.profile}
+parameters              {len(context.params or {})}
+timeout                 {f"{context.timeout:g}s" if context.timeout else "off"}
 verbose                 {context.verbose}
 
 Environment
@@ -194,31 +249,36 @@ USER                    {context.USER}
 
 Styling
 -----------
-prompt                  {context.prompt_session.message}
 style                   {context.style}
 table style             {context.table_style}
+'''
+        session: Optional['PromptSession'] = context.prompt_session
+        # there is no prompt session when running without the prompt (-c, -f)
+        if session is not None:
+            doc += f'''prompt                  {session.message}
 
 Prompt Toolkit 
 --------------
 
 Main
 ====
-multi-line              {context.prompt_session.multiline}
-editing mode            {context.prompt_session.editing_mode}
+multi-line              {session.multiline}
+editing mode            {session.editing_mode}
 
 Specifics
 =========
-bottom toolbar          {context.prompt_session.bottom_toolbar}
-wrap lines              {context.prompt_session.wrap_lines}
-right prompt            {context.prompt_session.rprompt}
-mouse support           {context.prompt_session.mouse_support}
-color depth             {context.prompt_session.color_depth}
-history search          {context.prompt_session.enable_history_search}
-search case sensitivity {context.prompt_session.search_ignore_case}
-complete while typing   {context.prompt_session.complete_while_typing}
-open in editor          {context.prompt_session.enable_open_in_editor}
-
-    '''.strip()
+bottom toolbar          {session.bottom_toolbar}
+wrap lines              {session.wrap_lines}
+right prompt            {session.rprompt}
+mouse support           {session.mouse_support}
+color depth             {session.color_depth}
+history search          {session.enable_history_search}
+search case sensitivity {session.search_ignore_case}
+complete while typing   {session.complete_while_typing}
+open in editor          {session.enable_open_in_editor}
+
+    '''
+        return doc.strip()
 
     def fire(self, context: SqliteCtxt) -> None:
         pattern: str = self.sanitise(context.user_input)
@@ -233,24 +293,65 @@ open in editor          {context.prompt_session.enable_open_in_editor}
 
 
 class DumpCmd(MetaCmd):
+    SYNTAX: str = 'Syntax: .dump [--gzip|--xz] [FILE|-] [PATTERN ...]\n' \
+                  '        .dump [--gzip|--xz] --split DIR [--jobs N] [PATTERN ...]'
+
     def __init__(self):
         super().__init__(".dump")
 
     def fire(self, context: SqliteCtxt) -> None:
-        maybe_file: Optional[str] = expanduser(
-            self.sanitise(context.user_input))
-        if maybe_file:
+        args: List[str] = split(self.sanitise(context.user_input))
+        compression: Optional[str] = None
+        directory: Optional[str] = None
+        jobs: int = 1
+        positional: List[str] = []
+
+        try:
+            while args:
+                arg: str = args.pop(0)
+                if arg in {'--gzip', '--xz'}:
+                    compression = arg[2:]
+                elif arg == '--split':
+                    directory = expanduser(args.pop(0))
+                elif arg == '--jobs':
+                    jobs = int(args.pop(0))
+                else:
+                    positional.append(arg)
+        except (IndexError, ValueError):
+            raise CommandError(DumpCmd.SYNTAX)
+
+        if directory is not None:
+            if not isdir(directory):
+                raise CommandError(f"Directory {directory} doesn't seem to exist.")
+            log.info(f'dumping tables matching {positional or "%"} into {directory} ({jobs} jobs)')
+            try:
+                written: Dict[str, int] = transfer.dump_split(
+                    context.con, read_only(context), directory, positional, compression, jobs)
+            except (sqlite3.Error, OSError) as e:
+                raise CommandError(f'Dump failed: {e}')
+            for path, n in written.items():
+                print(f'Wrote {path} ({n} lines of SQL).')
+            return
+
+        maybe_file: str = expanduser(positional.pop(0)) if positional else '-'
+        lines: Iterable[str] = transfer.dump_lines(context.con, positional)
+
+        if maybe_file != '-':
+            compression = compression or transfer.guess_compression(maybe_file)
             log.info(f'performing a database dump to {maybe_file}')
-            n = 0
-            with open(maybe_file, mode='a', encoding='utf-8') as f:
-                for line in context.con.iterdump():
-                    f.write(line + '\n')
-                    n += 1
+            try:
+                with transfer.open_output(maybe_file, compression=compression) as f:
+                    n: int = transfer.write_lines(f, lines)
+            except (sqlite3.Error, OSError) as e:
+                raise CommandError(f'Dump failed: {e}')
             print(f'Wrote database dump to {maybe_file} ({n} lines of SQL).')
         else:
             log.info('performing a database dump to STDOUT')
-            for line in context.con.iterdump():
-                print(line)
+            try:
+                transfer.write_lines(sys.stdout, lines)
+            except sqlite3.Error as e:
+                # not OSError, a closed pipe is handled by whoever owns stdout
+                raise CommandError(f'Dump failed: {e}')
 
 
 class OpenCmd(MetaCmd):
@@ -266,7 +367,7 @@ class OpenCmd(MetaCmd):
             log.debug(f'closed old connection to {context.database}')
             prompt = f'Would you like to create a new database in {abspath(file_name)}? [y/n]\n => '
             if isfile(file_name) or input(prompt).lower().startswith('y'):
-                context.con = sqlite3.connect(file_name)
+                context.con = connect(context, file_name)
                 context.database = file_name
                 log.debug(f'opened new connection to {file_name}')
                 log.debug(f'updating prompt_session from modified context')
@@ -296,9 +397,8 @@ class ShellCmd(MetaCmd):
             log.debug(f'running shell cmd "{" ".join(args)}"')
             print(run(args, stdout=PIPE, encoding='utf-8').stdout, end='')
         except IndexError:
-            print('Please provide args.')
-            for cmd in self.patterns:
-                print(f'Syntax: {cmd} <CMD> [ARG, ...]')
+            raise CommandError('\n'.join(['Please provide args.'] +
+                                         [f'Syntax: {cmd} <CMD> [ARG, ...]' for cmd in self.patterns]))
 
 
 class LogCmd(MetaCmd):
@@ -341,7 +441,7 @@ class PromptCmd(MetaCmd):
     def fire(self, context: SqliteCtxt) -> None:
         new_prompt = self.sanitise(context.user_input) + " "
         log.info(f'changing prompt from {context.prompt} to {new_prompt}')
-        context.prompt_session.message = new_prompt
+        context.prompt = new_prompt
 
 
 class ModeCmd(MetaCmd):
@@ -355,7 +455,418 @@ class ModeCmd(MetaCmd):
         context.table_style = new_style
 
 
+class ParamCmd(MetaCmd):
+    def __init__(self):
+        super().__init__(".parameter", ".param")
+
+    @staticmethod
+    def _value(context: SqliteCtxt, value: str) -> Any:
+        """Evaluate value as an SQL expression (e.g. 42, 'text', date('now')) falling back to plain text.
+        """
+        try:
+            return context.con.execute(f'SELECT {value}').fetchone()[0]
+        except sqlite3.Error:
+            return value
+
+    def fire(self, context: SqliteCtxt) -> None:
+        args: List[str] = self.sanitise(context.user_input).split(maxsplit=2)
+        action: str = args[0].lower() if args else 'list'
+        if context.params is None:
+            context.params = {}
+
+        if action == 'set' and len(args) == 3:
+            name: str = args[1].lstrip(':@$')
+            context.params[name] = ParamCmd._value(context, args[2])
+            log.info(f'bound :{name} to {context.params[name]!r}')
+
+        elif action == 'unset' and len(args) == 2:
+            context.params.pop(args[1].lstrip(':@$'), None)
+
+        elif action == 'clear':
+            context.params.clear()
+
+        elif action == 'list':
+            print(tabulate([(f':{k}', repr(v)) for k, v in context.params.items()]))
+
+        else:
+            raise CommandError('\n'.join(f'Syntax: {cmd} set NAME VALUE | unset NAME | list | clear'
+                                         for cmd in self.patterns))
+
+
+class ExportCmd(MetaCmd):
+    SYNTAX: str = f'Syntax: .export [--gzip|--xz] <{"|".join(transfer.EXPORT_FORMATS)}> <FILE> <QUERY>'
+
+    def __init__(self):
+        super().__init__(".export")
+
+    def fire(self, context: SqliteCtxt) -> None:
+        args: List[str] = self.sanitise(context.user_input).split(maxsplit=1)
+        compression: Optional[str] = args[0][2:] if args and args[0] in {'--gzip', '--xz'} else None
+        if compression:
+            args = args[1].split(maxsplit=1) if len(args) > 1 else []
+        args = args[:1] + (args[1].split(maxsplit=1) if len(args) > 1 else [])
+
+        if len(args) != 3 or args[0] not in transfer.EXPORT_FORMATS:
+            raise CommandError(ExportCmd.SYNTAX)
+
+        fmt, file_name, query = args
+        file_name = expanduser(file_name)
+        compression = compression or transfer.guess_compression(file_name)
+        log.info(f'exporting result of {query} to {file_name} ({fmt}{f", {compression}" if compression else ""})')
+
+        try:
+            cursor: Cursor = context.con.execute(query, context.params or ())
+            try:
+                transfer.export_cursor(cursor, file_name, fmt, compression)
+            finally:
+                cursor.close()
+        except (sqlite3.Error, OSError) as e:
+            raise CommandError(f'Export failed: {e}')
+
+
+class ImportCmd(MetaCmd):
+    SYNTAX: str = f'Syntax: .import [--{"|--".join(transfer.FORMATS)}] [--batch N] [--fast] <FILE> <TABLE>'
+
+    def __init__(self):
+        super().__init__(".import")
+
+    def fire(self, context: SqliteCtxt) -> None:
+        args: List[str] = split(self.sanitise(context.user_input))
+        fmt: Optional[str] = None
+        batch_size: int = transfer.BATCH_SIZE
+        fast: bool = False
+        positional: List[str] = []
+
+        try:
+            while args:
+                arg: str = args.pop(0)
+                if arg == '--fast':
+                    fast = True
+                elif arg == '--batch':
+                    batch_size = int(args.pop(0))
+                elif arg.startswith('--') and arg[2:] in transfer.FORMATS:
+                    fmt = arg[2:]
+                else:
+                    positional.append(arg)
+        except (IndexError, ValueError):
+            positional = []
+
+        if len(positional) != 2 or batch_size < 1:
+            raise CommandError(ImportCmd.SYNTAX)
+
+        file_name: str = expanduser(positional[0])
+        table: str = positional[1]
+
+        if not isfile(file_name):
+            raise CommandError(f"File {file_name} doesn't seem to exist.")
+
+        fmt = fmt or transfer.guess_format(file_name)
+        log.info(f'importing {file_name} ({fmt}) into {table} in batches of {batch_size}')
+
+        try:
+            transfer.import_file(context.con, file_name, table, fmt, batch_size, fast)
+        except (sqlite3.Error, csv.Error, OSError, ValueError) as e:
+            raise CommandError(f'Import failed (nothing was imported): {e}')
+
+
+class PagerCmd(MetaCmd):
+    def __init__(self):
+        super().__init__(".pager")
+
+    def fire(self, context: SqliteCtxt) -> None:
+        setting: str = self.sanitise(context.user_input).lower()
+        if setting in {'on', 'off'}:
+            log.info(f'turning pager {setting}')
+            context.pager = setting == 'on'
+        elif setting:
+            raise CommandError('Syntax: .pager [on|off]')
+        else:
+            print(f'Pager is {"ON" if context.pager else "OFF"}.')
+
+
+class ExplainCmd(MetaCmd):
+    def __init__(self):
+        super().__init__(".explain")
+
+    def fire(self, context: SqliteCtxt) -> None:
+        sql: str = self.sanitise(context.user_input)
+        if not sql:
+            raise CommandError('Syntax: .explain <QUERY>')
+        try:
+            lines: List[str] = plan.explain(context.con, sql, context.params or ())
+            print('\n'.join(lines) if lines else 'The statement has no query plan.')
+        except sqlite3.Error as e:
+            raise CommandError(f'An error occurred: {e}')
+
+
+class AdviseCmd(MetaCmd):
+    SYNTAX: str = 'Syntax: .advise <QUERY>\n        .advise --history [N]'
+    HISTORY: int = 50
+
+    def __init__(self):
+        super().__init__(".advise")
+
+    @staticmethod
+    def _history(context: SqliteCtxt, n: int) -> List[str]:
+        """Last n distinct statements from the history file an index could help (newest first).
+        """
+        statements: List[str] = []
+        from prompt_toolkit.history import FileHistory
+
+        for entry in FileHistory(expanduser(context.history)).load_history_strings():
+            entry = entry.strip().rstrip(';')
+            if advisor.is_advisable(entry) and entry not in statements:
+                statements.append(entry)
+                if len(statements) == n:
+                    break
+        return statements
+
+    def fire(self, context: SqliteCtxt) -> None:
+        args: str = self.sanitise(context.user_input)
+        if not args:
+            raise CommandError(AdviseCmd.SYNTAX)
+
+        if context.schema is None:
+            raise CommandError('The schema has not been read yet.')
+
+        history: List[str] = split(args) if args.startswith('--history') else []
+        if history and (len(history) > 2 or (len(history) == 2 and not history[1].isdigit())):
+            raise CommandError(AdviseCmd.SYNTAX)
+
+        try:
+            adv = advisor.Advisor(context.con, context.schema.columns)
+        except sqlite3.Error as e:
+            raise CommandError(f'An error occurred: {e}')
+
+        try:
+            if not history:
+                print('\n'.join(adv.advise(args.rstrip(';'), context.params or ()).report()))
+                return
+
+            statements: List[str] = AdviseCmd._history(context, int(history[1]) if len(history) == 2 else
+                                                       AdviseCmd.HISTORY)
+            log.info(f'reviewing {len(statements)} statements from {context.history}')
+            proposals = advisor.review(adv, statements)
+            if not proposals:
+                print(f'Reviewed {len(statements)} statements, no new indexes would help.')
+            for create, count, saved in proposals:
+                print(create)
+                print(f'-- helps {count} of {len(statements)} statements, ~{saved:,.0f} fewer rows visited')
+        except (sqlite3.Error, ValueError) as e:
+            raise CommandError(f'An error occurred: {e}')
+        finally:
+            adv.close()
+
+
+class EqpCmd(MetaCmd):
+    def __init__(self):
+        super().__init__(".eqp")
+
+    def fire(self, context: SqliteCtxt) -> None:
+        setting: str = self.sanitise(context.user_input).lower()
+        if setting in {'on', 'off'}:
+            log.info(f'turning query plans {setting}')
+            context.eqp = setting == 'on'
+        elif setting:
+            raise CommandError('Syntax: .eqp [on|off]')
+        else:
+            print(f'Query plans are {"ON" if context.eqp else "OFF"}.')
+
+
+class ProfileCmd(MetaCmd):
+    SYNTAX: str = f'Syntax: .profile [{"|".join(profiles.PROFILES)}]'
+
+    def __init__(self):
+        super().__init__(".profile")
+
+    def fire(self, context: SqliteCtxt) -> None:
+        profile: str = self.sanitise(context.user_input).lower()
+        if profile and profile not in profiles.PROFILES:
+            raise CommandError(ProfileCmd.SYNTAX)
+        elif profile:
+            log.info(f'switching to the {profile} profile')
+            context.profile = profile
+            # a running transaction would make switching the journal mode fail
+            context.con.commit()
+            profiles.apply(context.con, profile, reset=True)
+        print(profiles.describe(context.con, context.profile or 'default'))
+
+
+class TimerCmd(MetaCmd):
+    def __init__(self):
+        super().__init__(".timer")
+
+    def fire(self, context: SqliteCtxt) -> None:
+        setting: str = self.sanitise(context.user_input).lower()
+        if setting in {'on', 'off'}:
+            log.info(f'turning timer {setting}')
+            context.timer = setting == 'on'
+        elif setting:
+            raise CommandError('Syntax: .timer [on|off]')
+        else:
+            print(f'Timer is {"ON" if context.timer else "OFF"}.')
+
+
+class StatsCmd(MetaCmd):
+    def __init__(self):
+        super().__init__(".stats")
+
+    def fire(self, context: SqliteCtxt) -> None:
+        setting: str = self.sanitise(context.user_input).lower()
+        if setting in {'on', 'off'}:
+            log.info(f'turning stats {setting}')
+            context.show_stats = setting == 'on'
+        elif setting == 'last':
+            print(context.stats.report() if context.stats is not None else 'No statement has run yet.')
+        elif setting:
+            raise CommandError('Syntax: .stats [on|off|last]')
+        else:
+            print(f'Stats are {"ON" if context.show_stats else "OFF"}.')
+
+
+class TimeoutCmd(MetaCmd):
+    SYNTAX: str = 'Syntax: .timeout [SECONDS|off]'
+
+    def __init__(self):
+        super().__init__(".timeout")
+
+    def fire(self, context: SqliteCtxt) -> None:
+        setting: str = self.sanitise(context.user_input).lower()
+        if setting == 'off':
+            log.info('turning statement timeout off')
+            context.timeout = None
+        elif setting:
+            try:
+                seconds: float = float(setting)
+            except ValueError:
+                raise CommandError(TimeoutCmd.SYNTAX)
+            if seconds <= 0:
+                raise CommandError(TimeoutCmd.SYNTAX)
+            log.info(f'interrupting statements after {seconds}s')
+            context.timeout = seconds
+        elif context.timeout:
+            print(f'Statements are interrupted after {context.timeout:g}s.')
+        else:
+            print('Timeout is OFF.')
+
+
+class CacheCmd(MetaCmd):
+    SYNTAX: str = 'Syntax: .cache [on [MiB]|off|stats|clear]'
+
+    def __init__(self):
+        super().__init__(".cache")
+
+    def fire(self, context: SqliteCtxt) -> None:
+        args: List[str] = self.sanitise(context.user_input).lower().split()
+
+        if not args:
+            if context.cache is None:
+                print('Result cache is OFF.')
+            else:
+                print(f'Result cache is ON ({len(context.cache)} results, '
+                      f'{context.cache.size / 1024 ** 2:.1f} of {context.cache.budget / 1024 ** 2:.1f} MiB).')
+
+        elif args[0] == 'on' and len(args) <= 2:
+            try:
+                budget: int = int(float(args[1]) * 1024 ** 2) if len(args) == 2 else cache.BUDGET
+            except ValueError:
+                budget = 0
+            if budget <= 0:
+                raise CommandError(CacheCmd.SYNTAX)
+            log.info(f'caching query results in {budget} bytes')
+            context.cache = cache.ResultCache(budget)
+
+        elif args == ['off']:
+            log.info('turning result cache off')
+            context.cache = None
+
+        elif args == ['stats']:
+            print(context.cache.stats() if context.cache is not None else 'Result cache is OFF.')
+
+        elif args == ['clear']:
+            if context.cache is not None:
+                context.cache.clear()
+            print('Result cache cleared.')
+
+        else:
+            raise CommandError(CacheCmd.SYNTAX)
+
+
+def _no_result(context: SqliteCtxt, message: str) -> str:
+    """Why there is no last result, message if no statement has left one yet.
+    """
+    return f'No result kept ({context.last_missing}).' if context.last_missing else message
+
+
+class SortCmd(MetaCmd):
+    SYNTAX: str = 'Syntax: .sort <COLUMN> [asc|desc]'
+
+    def __init__(self):
+        super().__init__(".sort")
+
+    def fire(self, context: SqliteCtxt) -> None:
+        args: List[str] = self.sanitise(context.user_input).split()
+
+        if context.last is None:
+            raise CommandError(_no_result(context, 'No result to sort, run a query first.'))
+
+        elif not 1 <= len(args) <= 2 or (len(args) == 2 and args[1].lower() not in {'asc', 'desc'}):
+            raise CommandError(SortCmd.SYNTAX)
+
+        try:
+            context.last = context.last.sorted(args[0], descending=len(args) == 2 and args[1].lower() == 'desc')
+        except ValueError:
+            raise CommandError(f'No column {args[0]} in the last result ({", ".join(context.last.names)}).')
+
+        print_cursor(context.last.cursor(), context.table_style)
+
+
+class FilterCmd(MetaCmd):
+    SYNTAX: str = f'Syntax: .filter <COLUMN> <{"|".join(columns.OPERATORS)}> <VALUE> | off'
+
+    def __init__(self):
+        super().__init__(".filter")
+
+    def fire(self, context: SqliteCtxt) -> None:
+        args: List[str] = self.sanitise(context.user_input).split(maxsplit=2)
+
+        if context.last is None:
+            raise CommandError(_no_result(context, 'No result to filter, run a query first.'))
+
+        elif [a.lower() for a in args] == ['off']:
+            context.last = context.last.base()
+
+        elif len(args) != 3 or args[1] not in columns.OPERATORS:
+            raise CommandError(FilterCmd.SYNTAX)
+
+        else:
+            try:
+                context.last = context.last.filtered(args[0], args[1], columns.literal(args[2]))
+            except ValueError:
+                raise CommandError(f'No column {args[0]} in the last result ({", ".join(context.last.names)}).')
+
+        print_cursor(context.last.cursor(), context.table_style)
+        print(f'{len(context.last)} of {context.last.total} rows.')
+
+
+class LastCmd(MetaCmd):
+    def __init__(self):
+        super().__init__(".last")
+
+    def fire(self, context: SqliteCtxt) -> None:
+        if context.last is None:
+            raise CommandError(_no_result(context, 'No result yet, run a query first.'))
+
+        print_cursor(context.last.cursor(), context.table_style)
+        if len(context.last) != context.last.total:
+            print(f'{len(context.last)} of {context.last.total} rows.')
+
+
 class ReadCmd(MetaCmd):
+    SYNTAX: str = 'Syntax: .read [--edit] [--batch N] <FILE>'
+    # statements per transaction
+    BATCH_SIZE: int = 1000
+
     def __init__(self):
         super().__init__(".read")
 
@@ -372,52 +883,60 @@ class ReadCmd(MetaCmd):
 '''.lstrip()
 
     def fire(self, context: SqliteCtxt) -> None:
-        file_name: str = expanduser(self.sanitise(context.user_input))
+        from .batch import count, run_script
 
-        if not file_name:
-            print("Please provide a valid file name.")
-            return
+        args: List[str] = split(self.sanitise(context.user_input))
+        edit: bool = False
+        batch_size: int = ReadCmd.BATCH_SIZE
+        positional: List[str] = []
 
-        elif not isfile(file_name):
-            print(f"File {file_name} doesn't seem to exist.")
-            return
+        try:
+            while args:
+                arg: str = args.pop(0)
+                if arg == '--edit':
+                    edit = True
+                elif arg == '--batch':
+                    batch_size = int(args.pop(0))
+                else:
+                    positional.append(arg)
+        except (IndexError, ValueError):
+            positional = []
+
+        if len(positional) != 1 or batch_size < 1:
+            raise CommandError(ReadCmd.SYNTAX)
+
+        file_name: str = expanduser(positional[0])
+
+        if not isfile(file_name):
+            raise CommandError(f"File {file_name} doesn't seem to exist.")
 
         log.info(f'reading SQL script from {file_name}')
 
-        editor: Optional[str] = context.EDITOR
-
-        # $EDITOR env variable is set so open the script with it
-        if (editor is not None) or (editor == ''):
-            log.debug('editor was set, trying to edit script before running')
-            tmp_file = NamedTemporaryFile(
-                mode='a+', encoding='utf-8', delete=False)
-            tmp_file.write(ReadCmd._docstring(file_name))
-            with open(file_name, encoding='utf-8') as sql_script:
-                tmp_file.write(sql_script.read())
-            tmp_file.close()
-            run([editor, tmp_file.name])
-            with open(tmp_file.name, encoding='utf-8') as tmp_file:
-                query = tmp_file.read()
-            remove(tmp_file.name)
-
-        # $EDITOR not set, ask if eval?
-        elif input(f'Would you like to eval SQL from {file_name}? [y/n]\n => ').lower().startswith('y'):
-            with open(file_name, encoding='utf-8') as sql_script:
-                query = sql_script.read()
-
-        # disagreed to eval
+        if edit:
+            if not context.EDITOR:
+                raise CommandError('Set $EDITOR to edit scripts before running them.')
+            log.debug('editing script before running it')
+            with NamedTemporaryFile(mode='w', encoding='utf-8', suffix='.sql', delete=False) as tmp_file, \
+                    open(file_name, encoding='utf-8') as sql_script:
+                tmp_file.write(ReadCmd._docstring(file_name))
+                copyfileobj(sql_script, tmp_file)
+            run([context.EDITOR, tmp_file.name])
+            script: str = tmp_file.name
         else:
-            return
+            script = file_name
 
         try:
-            # run the script
-            with context.con as c:
-                cursor: Cursor = c.cursor()
-                cursor.executescript(query)
-                print(tabulate(cursor.fetchall()))
-                cursor.close()
-        except sqlite3.OperationalError as e:
-            print(str(e))
+            # one pass to count the statements for the progress report, then stream them again to run them
+            with open(script, encoding='utf-8') as f:
+                total: int = count(f)
+            with open(script, encoding='utf-8') as f:
+                status: int = run_script(context, f, 'table', batch_size, total)
+        finally:
+            if edit:
+                remove(script)
+        if status != 0:
+            # the error itself was reported by run_script
+            raise CommandError(f'Stopped running {file_name} at the first error.')
 
 
 class OutputCmd(MetaCmd):
@@ -442,7 +961,10 @@ class OutputCmd(MetaCmd):
 
         elif file_name:
             log.info(f'Redirecting output to {file_name}.')
-            sys.stdout = open(file_name, encoding='utf-8', mode='a')
+            try:
+                sys.stdout = open(file_name, encoding='utf-8', mode='a')
+            except OSError as e:
+                raise CommandError(f'Could not write to {file_name}: {e.strerror}')
 
 
 class CdCmd(MetaCmd):
@@ -457,26 +979,76 @@ class CdCmd(MetaCmd):
             # update cwd (necessary) to keep data in context valid
             context.PWD = getcwd()
             log.info(f'changed dir to {context.PWD}')
-            return
-        except FileNotFoundError:
-            pass
+        except OSError as e:
+            raise CommandError(f'Could not change directory to {path}: {e.strerror}')
 
 
 class BackupCmd(MetaCmd):
+    SYNTAX: str = 'Syntax: .backup [--pages N] [--rate PAGES_PER_SEC] [--sleep SECONDS] [--background] <FILE>'
+
     def __init__(self):
         super().__init__(".backup")
 
     def fire(self, context: SqliteCtxt) -> None:
-        target_file = self.sanitise(context.user_input)
-        if target_file:
-            log.info(f'backing up the database to {target_file}')
-            with sqlite3.connect(target_file) as backup:
-                context.con.backup(
-                    target=backup,
-                    progress=(
-                        lambda status, remaining, total: print(f'Copied {total - remaining} of {total} pages...')))
-        else:
-            print('Please provide output path.')
+        args: List[str] = split(self.sanitise(context.user_input))
+        options: Dict[str, float] = {'--pages': backup.PAGES, '--rate': 0, '--sleep': 0}
+        background: bool = False
+        positional: List[str] = []
+
+        try:
+            while args:
+                arg: str = args.pop(0)
+                if arg == '--background':
+                    background = True
+                elif arg in options:
+                    options[arg] = float(args.pop(0))
+                else:
+                    positional.append(arg)
+        except (IndexError, ValueError):
+            positional = []
+
+        job: Optional[backup.BackgroundBackup] = context.backup_job
+
+        if not positional and job is not None:
+            print(f'Backup to {job.path}: {job.status}.')
+            return
+        elif len(positional) != 1:
+            raise CommandError(BackupCmd.SYNTAX)
+
+        target_file: str = expanduser(positional[0])
+        pages: int = int(options['--pages'])
+
+        if background:
+            source: Optional[Callable[[], sqlite3.Connection]] = read_only(context)
+            if source is None:
+                raise CommandError('Only databases on disk can be backed up in the background.')
+            elif job is not None and job.is_alive():
+                raise CommandError(f'Backup to {job.path} is still running ({job.status}).')
+
+            def refresh(status: str) -> None:
+                context.backup_status = status
+                if context.prompt_session is not None and context.prompt_session.app.is_running:
+                    context.prompt_session.app.invalidate()
+
+            log.info(f'backing up the database to {target_file} in the background')
+            context.backup_job = backup.BackgroundBackup(
+                source, lambda: connect(context, target_file), target_file, pages, options['--rate'],
+                options['--sleep'], refresh)
+            context.backup_job.start()
+            return
+
+        log.info(f'backing up the database to {target_file}')
+        throttle = backup.Throttle(pages, options['--rate'], options['--sleep'], backup.print_progress)
+        target: Optional[sqlite3.Connection] = None
+        try:
+            target = connect(context, target_file)
+            backup.copy(context.con, target, pages, throttle)
+            print(f'Backed up database to {target_file}.')
+        except sqlite3.Error as e:
+            raise CommandError(f'Backup to {target_file} failed: {e}')
+        finally:
+            if target is not None:
+                target.close()
 
 
 meta_cmds: List[MetaCmd] = [
@@ -492,9 +1064,56 @@ meta_cmds: List[MetaCmd] = [
     TablesCmd(),
     OpenCmd(),
     ModeCmd(),
+    ExportCmd(),
+    ExplainCmd(),
+    EqpCmd(),
+    AdviseCmd(),
+    ImportCmd(),
+    PagerCmd(),
+    ParamCmd(),
+    ProfileCmd(),
+    TimeoutCmd(),
+    CacheCmd(),
+    SortCmd(),
+    FilterCmd(),
+    LastCmd(),
+    TimerCmd(),
+    StatsCmd(),
     LogCmd(),
     SaveCmd(),
     SchemaCmd(),
     StyleCmd(),
     PrintCmd(),
+    BackupCmd(),
 ]
+
+# name (e.g. ".show") -> command, one lookup per line instead of testing every command in turn
+registry: Dict[str, MetaCmd] = {}
+
+
+def register(cmd: MetaCmd) -> MetaCmd:
+    """Make cmd available under each of its patterns (replacing commands already registered under the same names).
+    """
+    for pattern in cmd.patterns:
+        registry[pattern] = cmd
+    return cmd
+
+
+def dispatch(context: SqliteCtxt) -> bool:
+    """Fire the meta command in context.user_input, False if it is not a meta command (i.e. it is SQL).
+
+    Raises CommandError if the command is unknown or failed.
+    """
+    name: Optional[str] = command_name(context.user_input)
+    if name is None:
+        return False
+    cmd: Optional[MetaCmd] = registry.get(name)
+    if cmd is None:
+        raise CommandError(f'Unknown command {name}, see .help for the list.')
+    log.debug(f'running {name} meta command')
+    cmd.fire(context)
+    return True
+
+
+for _cmd in meta_cmds:
+    register(_cmd)
@@ -0,0 +1,270 @@
+"""
+Built-in pager for query results.
+
+The cursor is kept open and only the rows needed for the viewport (plus a prefetch window) are fetched. Pages that
+fall out of the window are dropped; scrolling back to them re-runs the query and skips ahead.
+"""
+
+# Standard Library
+import re
+from collections import OrderedDict
+from sqlite3 import Cursor
+from typing import Any, Callable, List, Optional, Pattern, Sequence
+
+# 3rd Party
+from prompt_toolkit.application import Application
+from prompt_toolkit.application.current import get_app
+from prompt_toolkit.filters import Condition
+from prompt_toolkit.key_binding import KeyBindings, KeyPressEvent
+from prompt_toolkit.layout import ConditionalContainer, HSplit, Layout, Window
+from prompt_toolkit.layout.controls import FormattedTextControl
+from prompt_toolkit.widgets import TextArea
+
+# Relative
+from .render import _cell
+
+PAGE_SIZE: int = 200
+MAX_PAGES: int = 8
+
+# statements that can safely be re-run to scroll back
+_QUERY_PREFIXES = ('SELECT', 'VALUES', 'WITH')
+
+
+def is_query(sql: str) -> bool:
+    return sql.lstrip().upper().startswith(_QUERY_PREFIXES)
+
+
+class LazyRows:
+    """Random access to the rows of a query that keeps at most max_pages pages of page_size rows in memory.
+    """
+
+    def __init__(self, cursor: Cursor, execute: Callable[[], Cursor], page_size: int = PAGE_SIZE,
+                 max_pages: int = MAX_PAGES):
+        self._cursor: Cursor = cursor
+        self._execute: Callable[[], Cursor] = execute
+        self._page_size: int = page_size
+        self._max_pages: int = max_pages
+        self._pages: 'OrderedDict[int, List[Any]]' = OrderedDict()
+        self._next_page: int = 0
+        self.columns: List[str] = [d[0] for d in cursor.description or []]
+        self.total: Optional[int] = None
+
+    def _fetch(self) -> List[Any]:
+        rows: List[Any] = self._cursor.fetchmany(self._page_size)
+        if len(rows) < self._page_size:
+            self.total = self._next_page * self._page_size + len(rows)
+        self._pages[self._next_page] = rows
+        self._next_page += 1
+        while len(self._pages) > self._max_pages:
+            self._pages.popitem(last=False)
+        return rows
+
+    def page(self, i: int) -> List[Any]:
+        if i in self._pages:
+            self._pages.move_to_end(i)
+            return self._pages[i]
+
+        if self.total is not None and i * self._page_size >= self.total:
+            return []
+
+        if i < self._next_page:
+            # page was dropped, re-run the query and skip ahead
+            self._cursor.close()
+            self._cursor = self._execute()
+            self._next_page = 0
+
+        rows: List[Any] = []
+        while self._next_page <= i:
+            rows = self._fetch()
+            # end of this pass (total may be known from an earlier one)
+            if len(rows) < self._page_size and self._next_page <= i:
+                return []
+        return rows
+
+    def slice(self, start: int, n: int) -> List[Any]:
+        rows: List[Any] = []
+        i: int = start // self._page_size
+        offset: int = start % self._page_size
+        while len(rows) < n:
+            page: List[Any] = self.page(i)
+            rows.extend(page[offset:offset + n - len(rows)])
+            if len(page) < self._page_size:
+                break
+            i += 1
+            offset = 0
+        return rows
+
+    def count(self) -> int:
+        """Fetch up to the last row (keeping only the last pages) and return the number of rows.
+        """
+        while self.total is None:
+            self.page(self._next_page)
+        return self.total
+
+    def close(self) -> None:
+        self._cursor.close()
+        self._pages.clear()
+
+
+class Pager:
+    def __init__(self, rows: LazyRows):
+        self.rows: LazyRows = rows
+        self.top: int = 0
+        self.widths: List[int] = [len(c) for c in rows.columns]
+        self.pattern: Optional[Pattern] = None
+        self.message: str = ''
+        self.searching: bool = False
+        self.search_field = TextArea(height=1, prompt='/', multiline=False, accept_handler=self._accept_search)
+        self.body = Window(FormattedTextControl(self._body, focusable=True), wrap_lines=False)
+        self.app: Application = Application(
+            layout=Layout(HSplit([
+                Window(FormattedTextControl(self._header), height=1, wrap_lines=False),
+                self.body,
+                ConditionalContainer(self.search_field, filter=Condition(lambda: self.searching)),
+                Window(FormattedTextControl(self._status), height=1, style='reverse'),
+            ]), focused_element=self.body),
+            key_bindings=self._key_bindings(),
+            full_screen=True)
+
+    @staticmethod
+    def _cells(row: Sequence[Any]) -> List[str]:
+        return [_cell(v).replace('\n', '\\n') for v in row]
+
+    def _line(self, cells: List[str]) -> str:
+        return '  '.join(s.ljust(w) for s, w in zip(cells, self.widths))
+
+    @property
+    def height(self) -> int:
+        return max(get_app().output.get_size().rows - 2 - int(self.searching), 1)
+
+    def _visible(self) -> List[List[str]]:
+        visible: List[List[str]] = [self._cells(row) for row in self.rows.slice(self.top, self.height)]
+        # prefetch the page after the viewport
+        self.rows.slice(self.top + self.height, 1)
+        for cells in visible:
+            for i, s in enumerate(cells):
+                self.widths[i] = max(self.widths[i], len(s))
+        return visible
+
+    def _header(self) -> List[Any]:
+        return [('bold underline', self._line(self.rows.columns))]
+
+    def _body(self) -> str:
+        return '\n'.join(self._line(cells) for cells in self._visible())
+
+    def _status(self) -> str:
+        last: int = self.top + self.height
+        total: Optional[int] = self.rows.total
+        if total is not None:
+            last = min(last, total)
+        s: str = f' rows {self.top + 1}-{last} of {"?" if total is None else total}'
+        s += '  [q]uit [/]search [n]ext [g]top [G]end'
+        if self.message:
+            s += f'  {self.message}'
+        return s
+
+    def scroll(self, n: int) -> None:
+        self.message = ''
+        top: int = max(self.top + n, 0)
+        if self.rows.slice(top, 1) or top < self.top:
+            self.top = top
+
+    def end(self) -> None:
+        self.message = ''
+        self.top = max(self.rows.count() - self.height, 0)
+
+    def search(self) -> None:
+        if self.pattern is None:
+            return
+        i: int = self.top + 1
+        while True:
+            row: List[Any] = self.rows.slice(i, 1)
+            if not row:
+                self.message = f'Pattern not found: {self.pattern.pattern}'
+                return
+            if any(self.pattern.search(s) for s in self._cells(row[0])):
+                self.top = i
+                self.message = ''
+                return
+            i += 1
+
+    def _accept_search(self, buffer) -> bool:
+        self.searching = False
+        if buffer.text:
+            try:
+                self.pattern = re.compile(buffer.text, re.IGNORECASE)
+                self.search()
+            except re.error as e:
+                self.message = f'Invalid pattern: {e}'
+        self.app.layout.focus(self.body)
+        return False
+
+    def _key_bindings(self) -> KeyBindings:
+        kb = KeyBindings()
+        browsing = Condition(lambda: not self.searching)
+
+        @kb.add('q', filter=browsing)
+        @kb.add('escape', filter=browsing)
+        @kb.add('c-c')
+        def _(event: KeyPressEvent) -> None:
+            event.app.exit()
+
+        @kb.add('down', filter=browsing)
+        @kb.add('j', filter=browsing)
+        @kb.add('enter', filter=browsing)
+        def _(event: KeyPressEvent) -> None:
+            self.scroll(1)
+
+        @kb.add('up', filter=browsing)
+        @kb.add('k', filter=browsing)
+        def _(event: KeyPressEvent) -> None:
+            self.scroll(-1)
+
+        @kb.add('pagedown', filter=browsing)
+        @kb.add('space', filter=browsing)
+        @kb.add('f', filter=browsing)
+        def _(event: KeyPressEvent) -> None:
+            self.scroll(self.height)
+
+        @kb.add('pageup', filter=browsing)
+        @kb.add('b', filter=browsing)
+        def _(event: KeyPressEvent) -> None:
+            self.scroll(-self.height)
+
+        @kb.add('home', filter=browsing)
+        @kb.add('g', filter=browsing)
+        def _(event: KeyPressEvent) -> None:
+            self.top = 0
+
+        @kb.add('end', filter=browsing)
+        @kb.add('G', filter=browsing)
+        def _(event: KeyPressEvent) -> None:
+            self.end()
+
+        @kb.add('/', filter=browsing)
+        def _(event: KeyPressEvent) -> None:
+            self.searching = True
+            event.app.layout.focus(self.search_field)
+
+        @kb.add('n', filter=browsing)
+        def _(event: KeyPressEvent) -> None:
+            self.search()
+
+        @kb.add('escape', filter=Condition(lambda: self.searching))
+        def _(event: KeyPressEvent) -> None:
+            self.searching = False
+            event.app.layout.focus(self.body)
+
+        return kb
+
+    def run(self) -> None:
+        try:
+            self.app.run()
+        finally:
+            self.rows.close()
+
+
+def page_cursor(cursor: Cursor, execute: Callable[[], Cursor]) -> None:
+    """Browse rows of cursor in the pager, execute is used to re-run the query when scrolling back.
+    """
+    Pager(LazyRows(cursor, execute)).run()
@@ -0,0 +1,49 @@
+"""
+Small JSON files in the user's cache directory that let the REPL start without re-scanning PATH or re-introspecting
+the database.
+
+Every file records what it was built from (PATH and the mtimes of its directories, the schema versions of the
+database) so readers can tell a stale file from a fresh one. Files are replaced atomically and failing to read or
+write one is never an error, the data is simply rebuilt.
+"""
+
+# Standard Library
+import json
+from hashlib import sha1
+from logging import Logger, getLogger
+from os import getenv, makedirs, replace
+from os.path import expanduser, join
+from tempfile import NamedTemporaryFile
+from typing import Any, Dict, Optional
+
+log: Logger = getLogger()
+
+CACHE_DIR: str = join(getenv('XDG_CACHE_HOME') or expanduser('~/.cache'), 'sqliterepl')
+
+
+def cache_file(kind: str, key: str) -> str:
+    """Path of the cache file of kind for key (e.g. the path of a database).
+    """
+    return join(CACHE_DIR, f'{kind}-{sha1(key.encode("utf-8")).hexdigest()[:16]}.json')
+
+
+def load(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        log.debug(f'ignoring unreadable cache file {path}: {e}')
+        return None
+
+
+def save(path: str, data: Dict[str, Any]) -> None:
+    try:
+        makedirs(CACHE_DIR, exist_ok=True)
+        with NamedTemporaryFile('w', encoding='utf-8', dir=CACHE_DIR, suffix='.tmp', delete=False) as f:
+            json.dump(data, f)
+        replace(f.name, path)
+        log.debug(f'wrote cache file {path}')
+    except OSError as e:
+        log.debug(f'could not write cache file {path}: {e}')
@@ -0,0 +1,104 @@
+"""
+EXPLAIN QUERY PLAN rendered as a tree (like the official sqlite3 client) with warnings about full table scans.
+
+A SCAN that uses no index is flagged when the table is large, the size comes from the row estimates ANALYZE keeps in
+sqlite_stat1 or, for tables that were never analyzed, from max(rowid) (a single b-tree seek).
+"""
+
+# Standard Library
+import re
+from logging import Logger, getLogger
+from sqlite3 import Connection, Error
+from typing import Any, Dict, List, Optional, Pattern, Tuple
+
+# Relative
+from .tokens import aliases
+from .transfer import quote
+
+log: Logger = getLogger()
+
+# tables with at least as many rows are worth a warning when scanned
+LARGE_TABLE: int = 10000
+
+# "SCAN t", "SCAN t AS a" or "SCAN TABLE t" (SQLite < 3.36), but not "SCAN t USING INDEX i" or "SCAN (subquery-1)"
+_SCAN: Pattern = re.compile(r'^SCAN (?:TABLE )?([^\s()]+)(?: AS (\S+))?$')
+
+PlanRow = Tuple[int, int, int, str]
+
+
+def query_plan(con: Connection, sql: str, params: Any = ()) -> List[PlanRow]:
+    return con.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+
+
+def tree(plan: List[PlanRow]) -> List[str]:
+    """Lines of the plan drawn as a tree.
+    """
+    children: Dict[int, List[PlanRow]] = {}
+    for row in plan:
+        children.setdefault(row[1], []).append(row)
+
+    lines: List[str] = ['QUERY PLAN']
+
+    def draw(parent: int, indent: str) -> None:
+        nodes: List[PlanRow] = children.get(parent, [])
+        for i, (node, _, _, detail) in enumerate(nodes):
+            last: bool = i == len(nodes) - 1
+            lines.append(f'{indent}{"`--" if last else "|--"}{detail}')
+            draw(node, indent + ('   ' if last else '|  '))
+
+    draw(0, '')
+    return lines
+
+
+def row_estimate(con: Connection, table: str) -> Optional[int]:
+    """Approximate number of rows in table (None if it cannot be told cheaply).
+    """
+    try:
+        estimate = con.execute(
+            "SELECT max(CAST(stat AS INTEGER)) FROM sqlite_stat1 WHERE tbl = ? COLLATE NOCASE", (table,)).fetchone()
+        if estimate is not None and estimate[0] is not None:
+            return estimate[0]
+    except Error:
+        # no sqlite_stat1 until ANALYZE has been run
+        pass
+    try:
+        return con.execute(f'SELECT max(rowid) FROM {quote(table)}').fetchone()[0]
+    except Error as e:
+        # WITHOUT ROWID tables, views, virtual tables, CTEs
+        log.debug(f'no row estimate for {table}: {e}')
+        return None
+
+
+def full_scans(con: Connection, sql: str, plan: List[PlanRow], threshold: int = LARGE_TABLE) -> List[Tuple[str, int]]:
+    """(table, estimated rows) for every table scanned without an index that has at least threshold rows.
+    """
+    names: Dict[str, str] = {alias.casefold(): table for alias, table in aliases(sql).items()}
+    scans: Dict[str, int] = {}
+    for _, _, _, detail in plan:
+        m = _SCAN.match(detail)
+        if m is None:
+            continue
+        name: str = m.group(1)
+        table: str = names.get(name.casefold(), name)
+        if table in scans:
+            continue
+        rows: Optional[int] = row_estimate(con, table)
+        if rows is not None and rows >= threshold:
+            scans[table] = rows
+    return list(scans.items())
+
+
+def explain(con: Connection, sql: str, params: Any = (), threshold: int = LARGE_TABLE) -> List[str]:
+    """The plan of sql as a tree followed by full scan warnings (nothing for statements without a plan).
+    """
+    plan: List[PlanRow] = query_plan(con, sql, params)
+    if not plan:
+        return []
+    return tree(plan) + [f'Warning: full scan of {table} (~{rows:,} rows), consider adding an index'
+                         for table, rows in full_scans(con, sql, plan, threshold)]
+
+
+def print_plan(con: Connection, sql: str, params: Any = (), threshold: int = LARGE_TABLE) -> None:
+    lines: List[str] = explain(con, sql, params, threshold)
+    if lines:
+        print('\n'.join(lines))
@@ -0,0 +1,62 @@
+"""
+Sorted, case-folded index of completion candidates.
+
+Prefix lookups bisect the sorted keys so they cost O(log n + results) instead of a scan over every candidate.
+"""
+
+# Standard Library
+import re
+from bisect import bisect_left
+from typing import Iterable, Iterator, List, Optional, Pattern, Tuple
+
+# sorts after every other character
+_MAX_CHAR: str = '\U0010ffff'
+
+
+class PrefixIndex:
+    def __init__(self, entries: Iterable[Tuple[str, str]] = ()):
+        """Index (word, meta) pairs (duplicates are dropped).
+        """
+        items: List[Tuple[str, str, str]] = sorted({(word.casefold(), word, meta) for word, meta in entries})
+        self._keys: List[str] = [key for key, _, _ in items]
+        self._entries: List[Tuple[str, str]] = [(word, meta) for _, word, meta in items]
+
+    @staticmethod
+    def of(words: Iterable[str], meta: str) -> Iterator[Tuple[str, str]]:
+        return ((word, meta) for word in words)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def prefix(self, word: str, limit: Optional[int] = None) -> List[Tuple[str, str]]:
+        """Entries starting with word (case-insensitive), no more than limit of them if given.
+        """
+        key: str = word.casefold()
+        lo: int = bisect_left(self._keys, key)
+        hi: int = bisect_left(self._keys, key + _MAX_CHAR, lo)
+        if limit is not None:
+            hi = min(hi, lo + max(limit, 0))
+        return self._entries[lo:hi]
+
+    def fuzzy(self, word: str) -> List[Tuple[str, str]]:
+        """Entries starting with the first character of word and containing the rest of its characters in order,
+        tightest matches first.
+        """
+        key: str = word.casefold()
+        pattern: Pattern = re.compile('.*?'.join(map(re.escape, key)))
+        lo: int = bisect_left(self._keys, key[:1])
+        hi: int = bisect_left(self._keys, key[:1] + _MAX_CHAR, lo)
+        matches: List[Tuple[int, int]] = []
+        for i in range(lo, hi):
+            m = pattern.match(self._keys[i])
+            if m is not None:
+                matches.append((m.end(), i))
+        return [self._entries[i] for _, i in sorted(matches)]
+
+    def search(self, word: str, fuzzy: bool = True) -> List[Tuple[str, str]]:
+        """Prefix matches or, failing that (and if fuzzy is set), fuzzy matches for words of 2 or more characters.
+        """
+        found: List[Tuple[str, str]] = self.prefix(word)
+        if not found and fuzzy and len(word) > 1:
+            return self.fuzzy(word)
+        return found
@@ -0,0 +1,112 @@
+"""
+Named sets of PRAGMAs applied to every connection the REPL opens.
+
+default   leave SQLite's defaults alone
+safe      WAL with full syncing, survives power loss without losing committed transactions
+analytics WAL, 1 GiB memory map, 256 MiB page cache and temporary tables in memory for big read-mostly queries
+bulkload  no journal and no syncing with a 512 MiB page cache, fast loads but a crash can corrupt the database
+
+journal_mode=WAL is persistent (it is recorded in the database file), the other settings last as long as the
+connection.
+"""
+
+# Standard Library
+from logging import Logger, getLogger
+from sqlite3 import Connection, Error
+from typing import Any, Dict, List, Tuple
+
+log: Logger = getLogger()
+
+# in the order they are applied, busy_timeout first so that switching the journal mode waits for other connections
+PRAGMAS: Tuple[str, ...] = ('busy_timeout', 'journal_mode', 'synchronous', 'cache_size', 'mmap_size', 'temp_store')
+
+PROFILES: Dict[str, Dict[str, Any]] = {
+    'default': {},
+    'safe': {
+        'busy_timeout': 5000,
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',
+    },
+    'analytics': {
+        'busy_timeout': 5000,
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        # negative sizes are in KiB
+        'cache_size': -256 * 1024,
+        'mmap_size': 1024 ** 3,
+        'temp_store': 'MEMORY',
+    },
+    'bulkload': {
+        'busy_timeout': 5000,
+        'journal_mode': 'OFF',
+        'synchronous': 'OFF',
+        'cache_size': -512 * 1024,
+        'temp_store': 'MEMORY',
+    },
+}
+
+# what SQLite (and sqlite3.connect, for busy_timeout) starts with, used to undo a profile
+DEFAULTS: Dict[str, Any] = {
+    'busy_timeout': 5000,
+    'synchronous': 'FULL',
+    'cache_size': -2000,
+    'mmap_size': 0,
+    'temp_store': 'DEFAULT',
+}
+
+_SYNCHRONOUS: Tuple[str, ...] = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+_TEMP_STORE: Tuple[str, ...] = ('DEFAULT', 'FILE', 'MEMORY')
+
+
+def apply(con: Connection, profile: str, reset: bool = False) -> None:
+    """Set the PRAGMAs of profile on con (settings the connection refuses, e.g. on read-only databases, are skipped).
+
+    With reset the PRAGMAs profile does not set go back to their defaults (when switching profiles).
+    """
+    values: Dict[str, Any] = dict(PROFILES[profile])
+    if reset:
+        for pragma, value in DEFAULTS.items():
+            values.setdefault(pragma, value)
+        # unlike WAL these are not recorded in the database, a new connection would journal again
+        if 'journal_mode' not in values and con.execute('PRAGMA journal_mode').fetchone()[0] in {'off', 'memory'}:
+            values['journal_mode'] = 'DELETE'
+    for pragma in PRAGMAS:
+        if pragma not in values:
+            continue
+        value: Any = values[pragma]
+        try:
+            con.execute(f'PRAGMA {pragma} = {value}').fetchall()
+        except Error as e:
+            log.warning(f'could not set {pragma} to {value}: {e}')
+
+
+def settings(con: Connection) -> List[Tuple[str, str]]:
+    """Current values of the PRAGMAs profiles set (in a readable form).
+    """
+    current: List[Tuple[str, str]] = []
+    for pragma in PRAGMAS:
+        try:
+            row = con.execute(f'PRAGMA {pragma}').fetchone()
+        except Error as e:
+            log.debug(f'could not read {pragma}: {e}')
+            continue
+        if row is None:
+            # e.g. mmap_size of in-memory databases
+            continue
+        value: Any = row[0]
+        if pragma == 'synchronous':
+            value = _SYNCHRONOUS[value] if 0 <= value < len(_SYNCHRONOUS) else value
+        elif pragma == 'temp_store':
+            value = _TEMP_STORE[value] if 0 <= value < len(_TEMP_STORE) else value
+        elif pragma == 'cache_size':
+            value = f'{-value} KiB' if value < 0 else f'{value} pages'
+        elif pragma == 'mmap_size':
+            value = f'{value // 1024 ** 2} MiB' if value else 'off'
+        elif pragma == 'busy_timeout':
+            value = f'{value} ms'
+        current.append((pragma, str(value)))
+    return current
+
+
+def describe(con: Connection, profile: str) -> str:
+    return f'Profile {profile}: ' + ', '.join(f'{pragma}={value}' for pragma, value in settings(con))
@@ -0,0 +1,373 @@
+"""
+Rendering of query results.
+
+Rows are pulled from the cursor in batches (``fetchmany``) and printed as soon as they arrive so that memory use
+does not depend on the size of the result. Table styles that need to know column widths up front use a layout
+sampled from the first screenful of rows.
+
+Cells are formatted, aligned and padded here the way tabulate does it. The common styles (NATIVE_STYLES) are then
+drawn here as well, line by line, the others go through tabulate.
+"""
+
+# Standard Library
+from math import isinf, isnan
+from shutil import get_terminal_size
+from sqlite3 import Cursor
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+BATCH_SIZE: int = 1000
+
+# marker used to locate data rows in a rendered table (must not be used by any table style)
+_PROBE_CHAR: str = 'X'
+
+
+def _cell(value: Any) -> str:
+    """Stringify a value the way tabulate would (minus alignment).
+    """
+    if value is None:
+        return ''
+    elif isinstance(value, float):
+        return format(value, 'g')
+    elif isinstance(value, bytes):
+        try:
+            return str(value, 'ascii')
+        except UnicodeDecodeError:
+            return str(value)
+    return str(value)
+
+
+def tabulate(rows: Sequence[Sequence[Any]], **kwargs) -> str:
+    """tabulate.tabulate (imported on first use so that runs that print no tables never load it).
+    """
+    from tabulate import tabulate as _tabulate
+    return _tabulate(rows, **kwargs)
+
+
+# tabulate's column types from the least to the most generic one (bool never comes out of SQLite)
+_GENERIC: Dict[type, int] = {type(None): 0, int: 2, float: 3, bytes: 4, str: 5}
+
+_NUMBERS: Tuple[type, ...] = (int, float)
+
+
+def _kind(value: Any) -> type:
+    """Type of value as tabulate sees it: numbers in strings are numbers as well.
+    """
+    if value is None or type(value) in _NUMBERS:
+        return type(value)
+    elif not isinstance(value, (str, bytes)):
+        return str
+    text: type = bytes if isinstance(value, bytes) else str
+    try:
+        int(value)
+        return int
+    except ValueError:
+        pass
+    try:
+        number: float = float(value)
+    except ValueError:
+        return text
+    if isinf(number) or isnan(number):
+        return float if value.lower() in ('inf', '-inf', 'nan') else text
+    return float
+
+
+def _widen(kind: type, values: Sequence[Any], numparse: bool = True) -> type:
+    """The most generic of kind and the kinds of values (with numbers as text unless numparse).
+    """
+    for t in set(map(type, values)):
+        if not numparse:
+            t = t if t is bytes or t is type(None) else str
+            if _GENERIC[t] > _GENERIC[kind]:
+                kind = t
+        elif t is str or t is bytes:
+            for value in values:
+                if type(value) is t:
+                    kind = max(kind, _kind(value), key=_GENERIC.__getitem__)
+                    if kind is str:
+                        return kind
+        elif _GENERIC.get(t, _GENERIC[str]) > _GENERIC[kind]:
+            kind = t if t in _GENERIC else str
+    return kind
+
+
+def _format(value: Any, kind: type) -> str:
+    if value is None:
+        return ''
+    elif kind is bytes:
+        try:
+            return str(value, 'ascii')
+        except (TypeError, UnicodeDecodeError):
+            return str(value)
+    return str(value)
+
+
+def _afterpoint(s: str) -> int:
+    """Number of characters after the decimal point (or exponent) of a formatted float, -1 if it has neither.
+    """
+    point: int = s.rfind('.')
+    if point < 0:
+        point = s.lower().rfind('e')
+    return len(s) - point - 1 if point >= 0 else -1
+
+
+def _text_width(s: str) -> int:
+    """Width of s on a terminal as tabulate counts it (wide characters take two columns).
+    """
+    if s.isascii() and s.isprintable():
+        return len(s)
+    try:
+        from wcwidth import wcswidth
+    except ImportError:
+        return len(s)
+    return wcswidth(s)
+
+
+class _Columns:
+    """Types, widths and decimal places of the columns of a table rendered in batches, and the cells of rows
+    formatted and padded to them the way tabulate does: text stripped and left-aligned, numbers aligned on the decimal
+    point, every line of a multi-line cell padded to the width of the column. Empty cells stay empty: tabulate pads
+    them in single-line tables and leaves them out of multi-line rows (a row of nothing but empty cells disappears).
+
+    They are taken from the first batch, a later batch can only widen them.
+    """
+
+    def __init__(self, n: int, multiline: bool, align: Optional[str] = None,
+                 leave_unmeasured: bool = False):
+        self.kinds: List[type] = [type(None)] * n
+        self.widths: List[int] = [0] * n
+        self.decimals: List[int] = [-1] * n
+        # whether line breaks in cells start new lines (depends on the table style)
+        self.multiline: bool = multiline
+        # alignment of every column with numbers formatted as text (tabulate's pretty style), by type if None
+        self.align: Optional[str] = align
+        # leave cells that have no width (control characters) unpadded, tabulate pads them (past the column)
+        self.leave_unmeasured: bool = leave_unmeasured
+
+    @property
+    def aligns(self) -> List[str]:
+        if self.align is not None:
+            return [self.align] * len(self.kinds)
+        return ['right' if kind in _NUMBERS else 'left' for kind in self.kinds]
+
+    def format(self, rows: Sequence[Sequence[Any]]) -> List[Tuple[str, ...]]:
+        """Padded cells of rows (lines of multi-line cells joined by line breaks) after widening the columns to fit.
+        """
+        return list(zip(*(self._column(i, values) for i, values in enumerate(zip(*rows)))))
+
+    def _column(self, i: int, values: Sequence[Any]) -> List[str]:
+        kind: type = self.kinds[i] if self.kinds[i] is str else _widen(self.kinds[i], values, self.align is None)
+        self.kinds[i] = kind
+        align: str = self.align or ('right' if kind in _NUMBERS else 'left')
+        if kind is float:
+            strings: List[str] = ['' if v is None else format(v if type(v) is float else float(v), 'g')
+                                  for v in values]
+            decimals: List[int] = [_afterpoint(s) for s in strings]
+            top: int = max(self.decimals[i], max(decimals))
+            self.decimals[i] = top
+            strings = [s + ' ' * (top - d) for s, d in zip(strings, decimals)]
+        elif kind is bytes:
+            strings = [_format(v, kind).strip() for v in values]
+        elif kind in _NUMBERS:
+            strings = ['' if v is None else str(v) for v in values]
+        else:
+            strings = ['' if v is None else (v if type(v) is str else _format(v, kind)).strip() for v in values]
+
+        text: str = ''.join(strings)
+        if align != 'center' and text.isascii() and text.isprintable():
+            width: int = max(self.widths[i], max(map(len, strings)))
+            self.widths[i] = width
+            just: Callable[[str, int], str] = str.rjust if align == 'right' else str.ljust
+            if '' in strings:
+                return [s and just(s, width) for s in strings]
+            return [just(s, width) for s in strings]
+
+        def pad(s: str, w: int) -> str:
+            if w < 0 and self.leave_unmeasured:
+                return s
+            elif align == 'right':
+                return ' ' * (width - w) + s
+            elif align == 'left':
+                return s + ' ' * (width - w)
+            # like format(s, '^'), str.center puts the odd space on the other side
+            return ' ' * ((width - w) // 2) + s + ' ' * (width - w - (width - w) // 2)
+
+        if self.multiline and ('\n' in text or '\r' in text):
+            lines: List[List[str]] = [s.splitlines() for s in strings]
+            widths: List[List[int]] = [[_text_width(line) for line in cell] for cell in lines]
+            width = max(self.widths[i], max((w for cell in widths for w in cell), default=0))
+            self.widths[i] = width
+            return ['\n'.join(pad(line, w) for line, w in zip(cell, cell_widths))
+                    for cell, cell_widths in zip(lines, widths)]
+
+        single: List[int] = [_text_width(s) for s in strings]
+        width = max(self.widths[i], max(single))
+        self.widths[i] = width
+        return [s and pad(s, w) for s, w in zip(strings, single)]
+
+
+class _Layout:
+    """Fixed-width column layout for a table rendered in batches by tabulate.
+
+    The cells come formatted and padded by _Columns, tabulate only draws the table around them (and marks the
+    alignment of columns in the styles that do).
+    """
+
+    def __init__(self, sample: Sequence[Sequence[Any]], table_style: str):
+        from tabulate import multiline_formats
+        self.table_style: str = table_style
+        self.columns: _Columns = _Columns(len(sample[0]), table_style in multiline_formats,
+                                          'center' if table_style == 'pretty' else None, leave_unmeasured=True)
+        self.columns.format(self._escape(sample))
+        self._probe()
+
+    def _escape(self, rows: Sequence[Sequence[Any]]) -> Sequence[Sequence[Any]]:
+        """rows with blank text in the first column of rst tables escaped the way tabulate does (before measuring).
+        """
+        import tabulate as package
+        if self.table_style != 'rst' or not hasattr(package, '_rst_escape_first_column'):
+            return rows
+        return [(('..' if isinstance(row[0], (str, bytes)) and not row[0].strip() else row[0]),) + tuple(row[1:])
+                for row in rows]
+
+    def _probe(self) -> None:
+        """Find out which lines of the table style surround and separate data rows.
+        """
+        widths: List[int] = self.columns.widths
+        # a row as wide as the columns, empty ones as None which tabulate does not escape (rst)
+        self.marker: List[Optional[str]] = [_PROBE_CHAR * w if w else None for w in widths]
+        # nothing but empty cells so far, the marker has to go somewhere (only the number of lines matters here)
+        marker: List[Optional[str]] = self.marker if any(widths) else [_PROBE_CHAR] + self.marker[1:]
+        one: List[str] = self._tabulate([marker]).split('\n')
+        head: int = next(i for i, line in enumerate(one) if _PROBE_CHAR in line)
+        n: int = len(one) - head - 1
+        two: List[str] = self._tabulate([self.marker, self.marker]).split('\n')
+        self.head: int = head
+        self.tail: List[str] = two[len(two) - n:] if n else []
+        self.between: List[str] = two[head + 1:len(two) - n - 1]
+
+    def _tabulate(self, rows: Sequence[Sequence[Optional[str]]]) -> str:
+        import tabulate as package
+        preserve: bool = package.PRESERVE_WHITESPACE
+        # the cells are padded already, tabulate would strip them
+        package.PRESERVE_WHITESPACE = True
+        try:
+            return package.tabulate(rows, tablefmt=self.table_style, disable_numparse=True,
+                                    colalign=self.columns.aligns)
+        finally:
+            package.PRESERVE_WHITESPACE = preserve
+
+    def render(self, rows: Sequence[Sequence[Any]], first: bool = False) -> str:
+        before: Tuple[List[int], List[type]] = (list(self.columns.widths), list(self.columns.kinds))
+        rows = self._escape(rows)
+        cells: List[Tuple[str, ...]] = self.columns.format(rows)
+        if (self.columns.widths, self.columns.kinds) != before:
+            self._probe()
+        # empty cells (and blank ones at the start of rst rows) as None, which tabulate pads without escaping them,
+        # the marker row (cut off again) keeps the columns at their widths
+        rst: bool = self.table_style == 'rst'
+        lines: List[str] = self._tabulate([[None if not c or (rst and i == 0 and c.isspace()) else c
+                                            for i, c in enumerate(row)] for row in cells] + [self.marker]).split('\n')
+        body: List[str] = lines[:len(lines) - len(self.tail) - len(self.between) - 1]
+        return '\n'.join(body if first else (self.between + body[self.head:]))
+
+
+# begin, fill, separator, end
+_Line = Tuple[str, str, str, str]
+
+
+class _Style(NamedTuple):
+    above: Optional[_Line]
+    between: Optional[_Line]
+    below: Optional[_Line]
+    # begin, separator, end
+    row: Tuple[str, str, str]
+    padding: int
+    # whether the line above marks the alignment of columns with colons (pipe)
+    colons: bool = False
+
+
+# the same lines tabulate draws for tables without headers
+_STYLES: Dict[str, _Style] = {
+    'plain': _Style(None, None, None, ('', '  ', ''), 0),
+    'simple': _Style(('', '-', '  ', ''), None, ('', '-', '  ', ''), ('', '  ', ''), 0),
+    'psql': _Style(('+', '-', '+', '+'), None, ('+', '-', '+', '+'), ('|', '|', '|'), 1),
+    'pipe': _Style(('|', '-', '|', '|'), None, None, ('|', '|', '|'), 1, True),
+    'grid': _Style(('+', '-', '+', '+'), ('+', '-', '+', '+'), ('+', '-', '+', '+'), ('|', '|', '|'), 1),
+}
+
+NATIVE_STYLES: Tuple[str, ...] = tuple(_STYLES)
+
+
+class _NativeLayout:
+    """Fixed-width column layout drawn without tabulate (same interface and cells as _Layout).
+    """
+
+    def __init__(self, sample: Sequence[Sequence[Any]], table_style: str):
+        self.style: _Style = _STYLES[table_style]
+        self.columns: _Columns = _Columns(len(sample[0]), True)
+        self.columns.format(sample)
+
+    @property
+    def tail(self) -> List[str]:
+        return [self._line(self.style.below)] if self.style.below else []
+
+    def _line(self, line: _Line, colons: bool = False) -> str:
+        begin, fill, separator, end = line
+        widths: List[int] = [w + 2 * self.style.padding for w in self.columns.widths]
+        if colons:
+            return begin + separator.join(fill * (w - 1) + ':' if align == 'right' else ':' + fill * (w - 1)
+                                          for align, w in zip(self.columns.aligns, widths)) + end
+        return (begin + separator.join(fill * w for w in widths) + end).rstrip()
+
+    def _rows(self, cells: Sequence[str], multiline: bool) -> List[str]:
+        begin, separator, end = self.style.row
+        pad: str = ' ' * self.style.padding
+        separator = pad + separator + pad
+        widths: List[int] = self.columns.widths
+        if multiline:
+            # one line per line of the tallest cell, empty cells have none (like tabulate)
+            parts: List[List[str]] = [c.splitlines() for c in cells]
+            return [(begin + pad + separator.join(p[k] if k < len(p) else ' ' * w for p, w in zip(parts, widths)) +
+                     pad + end).rstrip() for k in range(max(map(len, parts)))]
+        if '' in cells:
+            cells = [c or ' ' * w for c, w in zip(cells, widths)]
+        # like tabulate no trailing spaces (plain and simple rows end with a cell)
+        return [(begin + pad + separator.join(cells) + pad + end).rstrip()]
+
+    def render(self, rows: Sequence[Sequence[Any]], first: bool = False) -> str:
+        cells: List[Tuple[str, ...]] = self.columns.format(rows)
+        multiline: bool = '\n' in ''.join(map(''.join, cells))
+        lines: List[str] = [self._line(self.style.above, self.style.colons)] if first and self.style.above else []
+        between: Optional[str] = self._line(self.style.between) if self.style.between else None
+        for i, row_cells in enumerate(cells):
+            if between is not None and (i or not first):
+                lines.append(between)
+            lines.extend(self._rows(row_cells, multiline))
+        return '\n'.join(lines)
+
+
+def print_cursor(cursor: Cursor, table_style: str = 'simple', batch_size: int = BATCH_SIZE) -> int:
+    """Print all rows from cursor as a table in table_style and return the number of rows printed.
+
+    The first screenful is printed right away, the rest follows in batches of batch_size rows.
+    """
+    rows: List[Any] = cursor.fetchmany(max(get_terminal_size().lines - 2, 1))
+
+    if not rows:
+        print('' if table_style in NATIVE_STYLES else tabulate([], tablefmt=table_style))
+        return 0
+
+    layout = _NativeLayout(rows, table_style) if table_style in NATIVE_STYLES else _Layout(rows, table_style)
+    n: int = 0
+    first: bool = True
+
+    while rows:
+        print(layout.render(rows, first), flush=first)
+        n += len(rows)
+        first = False
+        rows = cursor.fetchmany(batch_size)
+
+    if layout.tail:
+        print('\n'.join(layout.tail))
+
+    return n
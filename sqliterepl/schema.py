@@ -0,0 +1,135 @@
+"""
+Cache of table and column names in the open database (including ATTACHed databases) used for completion.
+
+The cache is refreshed between statements (on the thread that owns the connection) and only re-introspects the
+database when PRAGMA schema_version of one of the databases changed, completion itself never touches the database.
+
+Databases on disk are also cached in a file (see persist) keyed by their path. When a connection is new the file is
+used as is if the schema versions match, otherwise its (stale) contents are used while a background thread
+re-introspects the database on a connection of its own.
+"""
+
+# Standard Library
+from itertools import chain
+from logging import Logger, getLogger
+from sqlite3 import Connection, Error
+from threading import Thread
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Relative
+from . import persist
+from .prefix import PrefixIndex
+
+Versions = Tuple[Tuple[str, int], ...]
+
+log: Logger = getLogger()
+
+
+class SchemaCache:
+    def __init__(self):
+        self._con: Optional[Connection] = None
+        self._versions: Versions = ()
+        self._background: Optional[Thread] = None
+        self.schemas: List[str] = []
+        self.tables: List[str] = []
+        self.columns: Dict[str, List[str]] = {}
+        self.column_names: List[str] = []
+        self.table_index: PrefixIndex = PrefixIndex()
+        self.column_index: PrefixIndex = PrefixIndex()
+
+    @staticmethod
+    def _schema_versions(con: Connection) -> Versions:
+        return tuple((name, con.execute(f'PRAGMA "{name}".schema_version').fetchone()[0])
+                     for _, name, _ in con.execute('PRAGMA database_list').fetchall())
+
+    def refresh(self, con: Connection, database: Optional[str] = None,
+                connect: Optional[Callable[[], Connection]] = None) -> bool:
+        """Re-introspect the database if it changed and return True if it did.
+
+        database is the absolute path (or URI) of a database on disk to cache in a file, connect is a factory of
+        connections to it that may be used on another thread.
+        """
+        if self._background is not None and self._background.is_alive():
+            return False
+
+        try:
+            versions: Versions = SchemaCache._schema_versions(con)
+        except Error as e:
+            log.debug(f'could not read schema version: {e}')
+            return False
+
+        if con is self._con and versions == self._versions:
+            return False
+
+        path: Optional[str] = persist.cache_file('schema', database) if database else None
+
+        if path is not None and con is not self._con:
+            cached = persist.load(path)
+            if cached is not None and tuple(map(tuple, cached['versions'])) == versions:
+                log.debug(f'schema of {database} loaded from {path}')
+                self._set(con, versions, cached['tables'], cached['columns'])
+                return True
+            elif cached is not None:
+                self._set(None, (), cached['tables'], cached['columns'])
+            if connect is not None:
+                # the stale (or empty) cache serves completion until the new one is ready
+                log.debug(f'refreshing schema cache of {database} in the background')
+                self._background = Thread(target=self._refresh_in_background, args=(con, versions, connect, path),
+                                          name='schema cache', daemon=True)
+                self._background.start()
+                return True
+
+        self._set(con, versions, *SchemaCache._introspect(con, versions))
+        if path is not None:
+            self._save(path)
+        return True
+
+    def _refresh_in_background(self, con: Connection, versions: Versions, connect: Callable[[], Connection],
+                               path: str) -> None:
+        try:
+            other: Connection = connect()
+            try:
+                self._set(con, versions, *SchemaCache._introspect(other, versions))
+            finally:
+                other.close()
+        except Error as e:
+            log.debug(f'could not refresh schema cache in the background: {e}')
+            return
+        self._save(path)
+
+    def _save(self, path: str) -> None:
+        persist.save(path, {'versions': self._versions, 'tables': self.tables, 'columns': self.columns})
+
+    @staticmethod
+    def _introspect(con: Connection, versions: Versions) -> Tuple[List[str], Dict[str, List[str]]]:
+        log.debug(f'introspecting schema {versions}')
+
+        tables: List[str] = []
+        columns: Dict[str, List[str]] = {}
+
+        for schema, _ in versions:
+            prefix: str = '' if schema in {'main', 'temp'} else f'{schema}.'
+            for table, column in con.execute(
+                    f"SELECT m.name, p.name FROM \"{schema}\".sqlite_master AS m "
+                    f"LEFT JOIN pragma_table_info(m.name, '{schema}') AS p "
+                    f"WHERE m.type IN ('table', 'view') ORDER BY m.name, p.cid"):
+                name: str = prefix + table
+                if name not in columns:
+                    tables.append(name)
+                    columns[name] = []
+                if column is not None:
+                    columns[name].append(column)
+
+        return tables, columns
+
+    def _set(self, con: Optional[Connection], versions: Versions, tables: List[str],
+             columns: Dict[str, List[str]]) -> None:
+        self._con = con
+        self._versions = versions
+        self.schemas = [schema for schema, _ in versions]
+        self.tables = tables
+        self.columns = columns
+        self.column_names = sorted({c for cols in columns.values() for c in cols})
+        self.table_index = PrefixIndex(chain(PrefixIndex.of(self.tables, 'table'),
+                                             PrefixIndex.of(self.schemas, 'database')))
+        self.column_index = PrefixIndex(PrefixIndex.of(self.column_names, 'column'))
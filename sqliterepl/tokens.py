@@ -0,0 +1,208 @@
+"""
+Incremental SQL tokenizer and detection of the clause at the cursor for context-sensitive completion.
+
+The buffer is lexed with the same pygments SqlLexer that highlights it (imported on first use, it is one of the
+slowest modules to import). When the buffer changes only the tail
+starting at the last whitespace token before the first changed character is re-lexed (whitespace is only ever
+emitted in the root state of the lexer so it is safe to restart from there).
+"""
+
+# Standard Library
+from bisect import bisect_right
+from os.path import commonprefix
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
+
+# 3rd Party
+from pygments.token import Comment, Error, Name, String, Text, Whitespace
+
+Token = Tuple[int, Any, str]
+
+# kinds of clause
+ANY: str = 'any'
+KEYWORD: str = 'keyword'
+TABLE: str = 'table'
+EXPRESSION: str = 'expression'
+PRAGMA: str = 'pragma'
+# nothing to complete, e.g. after VALUES where only a parenthesis can follow
+NONE: str = 'none'
+
+_TABLE_KEYWORDS: Set[str] = {'FROM', 'JOIN', 'INTO', 'UPDATE', 'TABLE'}
+_EXPRESSION_KEYWORDS: Set[str] = {
+    '(', '=', '==', '!=', '<>', '<', '<=', '>', '>=', '+', '-', '*', '/', '%', '||',
+    'SELECT', 'DISTINCT', 'WHERE', 'ON', 'BY', 'SET', 'HAVING', 'AND', 'OR', 'NOT', 'CASE', 'WHEN', 'THEN', 'ELSE',
+    'IN', 'IS', 'LIKE', 'GLOB', 'BETWEEN', 'RETURNING', 'USING',
+}
+# keywords that can only be followed by another keyword (INSERT INTO, ORDER BY, CREATE TABLE, ...)
+_KEYWORD_KEYWORDS: Set[str] = {
+    'INSERT', 'REPLACE', 'DELETE', 'CREATE', 'DROP', 'ALTER', 'ORDER', 'GROUP', 'PRIMARY', 'FOREIGN', 'INNER', 'CROSS',
+    'NATURAL', 'OUTER',
+}
+_CLAUSE_KEYWORDS: Set[str] = _TABLE_KEYWORDS | {'SELECT', 'WHERE', 'BY', 'SET', 'HAVING', 'VALUES', 'RETURNING'}
+# keywords that may follow a table name in FROM, they are not aliases
+_NOT_ALIASES: Set[str] = {
+    'WHERE', 'JOIN', 'INNER', 'LEFT', 'RIGHT', 'FULL', 'CROSS', 'NATURAL', 'OUTER', 'ON', 'USING', 'GROUP', 'ORDER',
+    'LIMIT', 'HAVING', 'WINDOW', 'UNION', 'EXCEPT', 'INTERSECT', 'SET', 'VALUES', 'SELECT', 'DEFAULT', 'INDEXED',
+    'NOT', 'AS',
+}
+
+
+def _is_space(token: Token) -> bool:
+    # older pygments emit plain Text for whitespace
+    return token[1] in Whitespace or (token[1] is Text and token[2].isspace())
+
+
+def _sql_lexer() -> Any:
+    from pygments.lexers.sql import SqlLexer
+    return SqlLexer()
+
+
+class IncrementalLexer:
+    def __init__(self):
+        self._lexer: Any = _sql_lexer()
+        # (text, tokens, token start positions, index of the first error token) swapped in one assignment so
+        # concurrent completions stay consistent
+        self._state: Tuple[str, List[Token], List[int], int] = ('', [], [], 0)
+
+    def tokenize(self, text: str) -> List[Token]:
+        old_text, old_tokens, starts, error = self._state
+
+        if text == old_text:
+            return old_tokens
+
+        changed: int = len(old_text) if text.startswith(old_text) else len(commonprefix([old_text, text]))
+
+        # keep tokens up to (and including) the last whitespace token that ends before the change, an error token
+        # (e.g. an unterminated quote) may lex differently once the change is in so nothing after one is kept
+        i: int = min(bisect_right(starts, changed - 1) - 2, error - 1)
+        while i >= 0 and not _is_space(old_tokens[i]):
+            i -= 1
+
+        tokens: List[Token] = old_tokens[:max(i + 1, 0)]
+        restart: int = (tokens[-1][0] + len(tokens[-1][2])) if tokens else 0
+        tokens.extend((restart + pos, ttype, value)
+                      for pos, ttype, value in self._lexer.get_tokens_unprocessed(text[restart:]))
+
+        error = next((j for j in range(max(i + 1, 0), len(tokens)) if tokens[j][1] in Error), len(tokens))
+        self._state = (text, tokens, [pos for pos, _, _ in tokens], error)
+        return tokens
+
+
+class Clause(NamedTuple):
+    kind: str
+    # table (or alias) or database before the dot in "tbl.col"
+    qualifier: Optional[str]
+    # aliases (and table names) in the statement mapped to table names
+    aliases: Dict[str, str]
+
+
+def _is_name(token: Token) -> bool:
+    return token[1] in Name or token[1] in String.Symbol
+
+
+def _significant(tokens: List[Token]) -> List[Token]:
+    return [t for t in tokens if not (_is_space(t) or t[1] in Comment)]
+
+
+def _statement(tokens: List[Token], cursor: int) -> Tuple[List[Token], List[Token]]:
+    """Significant tokens of the statement under the cursor split into those before and those after it.
+    """
+    before: List[Token] = []
+    after: List[Token] = []
+    for token in _significant(tokens):
+        pos, ttype, value = token
+        if pos < cursor:
+            if value == ';':
+                before = []
+            else:
+                before.append(token)
+        elif value == ';':
+            break
+        else:
+            after.append(token)
+    return before, after
+
+
+def _aliases(tokens: List[Token]) -> Dict[str, str]:
+    aliases: Dict[str, str] = {}
+    i: int = 0
+    while i < len(tokens):
+        if tokens[i][2].upper() in _TABLE_KEYWORDS:
+            j: int = i + 1
+            name: List[str] = []
+            # [schema.]table
+            while j < len(tokens) and _is_name(tokens[j]):
+                name.append(tokens[j][2].strip('"`[]'))
+                j += 1
+                if j + 1 < len(tokens) and tokens[j][2] == '.':
+                    name.append('.')
+                    j += 1
+                else:
+                    break
+            table: str = ''.join(name)
+            if table and not table.endswith('.'):
+                aliases[table] = table
+                if j < len(tokens) and tokens[j][2].upper() == 'AS':
+                    j += 1
+                if j < len(tokens) and tokens[j][1] in Name and tokens[j][2].upper() not in _NOT_ALIASES:
+                    aliases[tokens[j][2]] = table
+            i = j
+        else:
+            i += 1
+    return aliases
+
+
+def lex(text: str) -> List[Token]:
+    """Significant (not whitespace or comment) tokens of the SQL text.
+    """
+    return _significant(list(_sql_lexer().get_tokens_unprocessed(text)))
+
+
+def aliases(text: str) -> Dict[str, str]:
+    """Aliases (and table names) in the SQL text mapped to table names.
+    """
+    return _aliases(lex(text))
+
+
+def clause_at(tokens: List[Token], cursor: int, word: str) -> Clause:
+    """Work out what is expected at cursor where word is the (partial) word right before the cursor.
+    """
+    before, after = _statement(tokens, cursor - len(word))
+    aliases: Dict[str, str] = _aliases(before + after)
+    qualifier: Optional[str] = word.rsplit('.', 1)[0] if '.' in word else None
+
+    if qualifier is not None:
+        return Clause(EXPRESSION, qualifier, aliases)
+
+    if not before:
+        return Clause(KEYWORD, None, aliases)
+
+    prev: str = before[-1][2].upper()
+
+    if prev == 'PRAGMA':
+        return Clause(PRAGMA, None, aliases)
+    elif prev == 'VALUES':
+        return Clause(NONE, None, aliases)
+    elif prev in _KEYWORD_KEYWORDS:
+        return Clause(KEYWORD, None, aliases)
+    elif prev in _TABLE_KEYWORDS:
+        return Clause(TABLE, None, aliases)
+    elif prev == ',':
+        depth: int = 0
+        for _, _, value in reversed(before):
+            if value == ')':
+                depth += 1
+            elif value == '(':
+                if depth == 0:
+                    # inside a list in parentheses e.g. INSERT INTO tbl (a, |
+                    return Clause(EXPRESSION, None, aliases)
+                depth -= 1
+            elif depth == 0 and value.upper() in _CLAUSE_KEYWORDS:
+                return Clause(TABLE if value.upper() in _TABLE_KEYWORDS else EXPRESSION, None, aliases)
+        return Clause(EXPRESSION, None, aliases)
+    elif prev in _EXPRESSION_KEYWORDS:
+        return Clause(EXPRESSION, None, aliases)
+    elif _is_name(before[-1]) or prev == ')':
+        # right after a name (SELECT a |, FROM tbl |) a keyword is expected
+        return Clause(KEYWORD, None, aliases)
+
+    return Clause(ANY, None, aliases)
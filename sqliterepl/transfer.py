@@ -0,0 +1,435 @@
+"""
+Bulk loading of data into and out of the database.
+
+Input is streamed, converted and inserted in batches with executemany, output is written batch by batch from
+fetchmany through a bounded buffer, so memory use does not depend on the amount of data.
+
+The binary export format is a stream of little-endian, length-prefixed values:
+
+    header  b'SQLR' VERSION:u8 N_COLUMNS:u32 (NAME_LENGTH:u32 NAME:utf-8){N_COLUMNS}
+    row     (TAG:u8 VALUE){N_COLUMNS} for every row until the end of the file
+
+where TAG is 0 for NULL (no value), 1 for INTEGER (i64), 2 for REAL (f64), 3 for TEXT (LENGTH:u32 utf-8) and 4 for
+BLOB (LENGTH:u32 bytes).
+"""
+
+# Standard Library
+import csv
+import gzip
+import io
+import json
+import lzma
+import re
+import struct
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, islice
+from os.path import join, splitext
+from sqlite3 import Connection, Cursor
+from time import perf_counter
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, List, Optional, Pattern, Sequence, Set, TextIO, Tuple
+
+# Relative
+from .utils import log
+
+FORMATS: Tuple[str, ...] = ('csv', 'tsv', 'jsonl')
+EXPORT_FORMATS: Tuple[str, ...] = FORMATS + ('binary',)
+BATCH_SIZE: int = 10000
+BUFFER_SIZE: int = 1 << 20
+
+# characters not allowed in the names of files written by dump_split
+_UNSAFE: Pattern = re.compile(r'[^\w.-]')
+
+# compression name -> (opener, file name suffix)
+COMPRESSIONS: Dict[str, Tuple[Callable[..., IO], str]] = {
+    'gzip': (gzip.open, '.gz'),
+    'xz': (lzma.open, '.xz'),
+}
+
+BINARY_MAGIC: bytes = b'SQLR'
+BINARY_VERSION: int = 1
+
+_EXTENSIONS: Dict[str, str] = {
+    '.csv': 'csv',
+    '.tsv': 'tsv',
+    '.tab': 'tsv',
+    '.jsonl': 'jsonl',
+    '.ndjson': 'jsonl',
+}
+
+
+def guess_format(path: str, default: str = 'csv') -> str:
+    root, ext = splitext(path)
+    if guess_compression(path):
+        ext = splitext(root)[1]
+    return _EXTENSIONS.get(ext.lower(), default)
+
+
+def guess_compression(path: str) -> Optional[str]:
+    return next((name for name, (_, suffix) in COMPRESSIONS.items() if path.lower().endswith(suffix)), None)
+
+
+def quote_identifier(name: str) -> str:
+    """Quote name as one identifier (dots included).
+    """
+    return '"' + name.replace('"', '""') + '"'
+
+
+def quote(name: str) -> str:
+    """Quote an identifier, schema.table is quoted part by part.
+    """
+    return '.'.join(map(quote_identifier, name.split('.', 1)))
+
+
+def chunks(rows: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    it: Iterator[Any] = iter(rows)
+    chunk: List[Any] = list(islice(it, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(it, size))
+
+
+class Progress:
+    """Report the number of rows processed and throughput on stderr (overwriting the same line on a terminal), away
+    from the rows a batch run may be writing to stdout.
+    """
+
+    def __init__(self, verb: str):
+        self.verb: str = verb
+        self.rows: int = 0
+        self.start: float = perf_counter()
+
+    @property
+    def rate(self) -> float:
+        return self.rows / max(perf_counter() - self.start, 1e-9)
+
+    def update(self, n: int) -> None:
+        self.rows += n
+        if sys.stderr.isatty():
+            print(f'{self.verb} {self.rows} rows ({self.rate:.0f} rows/s)...', end='\r', file=sys.stderr, flush=True)
+
+    def done(self, what: str) -> None:
+        print(f'{self.verb} {self.rows} rows {what} in {perf_counter() - self.start:.2f}s ({self.rate:.0f} rows/s).',
+              file=sys.stderr)
+
+
+def _sql_type(values: Iterable[Any]) -> str:
+    """Narrowest column type for values (strings that look like numbers count as numbers).
+    """
+    sql_type: str = 'INTEGER'
+    for v in values:
+        if v is None or v == '':
+            continue
+        elif isinstance(v, str):
+            try:
+                int(v)
+                continue
+            except ValueError:
+                try:
+                    float(v)
+                    sql_type = 'REAL'
+                    continue
+                except ValueError:
+                    return 'TEXT'
+        elif isinstance(v, float):
+            sql_type = 'REAL'
+        elif not isinstance(v, int):
+            return 'TEXT'
+    return sql_type
+
+
+def _read_delimited(f: TextIO, delimiter: str) -> Tuple[List[str], Iterator[Sequence[Any]]]:
+    reader = csv.reader(f, delimiter=delimiter)
+    columns: List[str] = next(reader, [])
+    n: int = len(columns)
+    # blank lines are skipped, missing fields are NULL, extra fields are dropped
+    return columns, (row if len(row) == n else (row + [None] * n)[:n] for row in reader if row)
+
+
+def _read_jsonl(f: TextIO, sample_size: int) -> Tuple[List[str], Iterator[Sequence[Any]]]:
+    def parse() -> Iterator[Dict[str, Any]]:
+        for n, line in enumerate(f, 1):
+            if line.strip():
+                obj: Any = json.loads(line)
+                if not isinstance(obj, dict):
+                    raise ValueError(f'line {n} is not a JSON object')
+                yield obj
+
+    objects: Iterator[Dict[str, Any]] = parse()
+    sample: List[Dict[str, Any]] = list(islice(objects, sample_size))
+    columns: List[str] = list(dict.fromkeys(k for obj in sample for k in obj))
+
+    def to_row(obj: Dict[str, Any]) -> Tuple[Any, ...]:
+        return tuple(json.dumps(v) if isinstance(v, (dict, list)) else v for v in map(obj.get, columns))
+
+    def rows() -> Iterator[Tuple[Any, ...]]:
+        for obj in sample:
+            yield to_row(obj)
+        for obj in objects:
+            yield to_row(obj)
+
+    return columns, rows()
+
+
+def read_rows(f: TextIO, fmt: str, sample_size: int = BATCH_SIZE) -> Tuple[List[str], Iterator[Sequence[Any]]]:
+    """Column names and an iterator over rows of f in fmt.
+    """
+    if fmt == 'jsonl':
+        return _read_jsonl(f, sample_size)
+    return _read_delimited(f, '\t' if fmt == 'tsv' else ',')
+
+
+def _table_exists(con: Connection, table: str) -> bool:
+    schema, _, name = table.rpartition('.')
+    return con.execute(f"SELECT 1 FROM {quote(schema or 'main')}.sqlite_master WHERE type IN ('table', 'view') "
+                       f"AND name = ?", (name,)).fetchone() is not None
+
+
+def import_file(con: Connection, path: str, table: str, fmt: str, batch_size: int = BATCH_SIZE,
+                fast: bool = False) -> int:
+    """Load rows from the file at path in fmt into table (creating it if needed) and return the number of rows.
+
+    All rows are inserted in one transaction. With fast, PRAGMA synchronous=OFF and journal_mode=MEMORY are in
+    effect during the load (the previous settings are restored afterwards).
+    """
+    pragmas: Dict[str, Any] = {}
+    if fast:
+        for pragma, value in [('synchronous', 'OFF'), ('journal_mode', 'MEMORY')]:
+            pragmas[pragma] = con.execute(f'PRAGMA {pragma}').fetchone()[0]
+            con.execute(f'PRAGMA {pragma} = {value}')
+            log.debug(f'PRAGMA {pragma} = {value} during import (was {pragmas[pragma]})')
+
+    progress = Progress('Imported')
+
+    try:
+        with open(path, encoding='utf-8', newline='') as f, con:
+            if not con.in_transaction:
+                con.execute('BEGIN')
+            columns, rows = read_rows(f, fmt, batch_size)
+            if not columns:
+                raise ValueError(f'no columns found in {path}')
+            batches: Iterator[List[Sequence[Any]]] = chunks(rows, batch_size)
+            first: List[Sequence[Any]] = next(batches, [])
+
+            if not _table_exists(con, table):
+                types: List[str] = [_sql_type(row[i] for row in first if i < len(row)) for i in range(len(columns))]
+                definition: str = ', '.join(f'{quote_identifier(c)} {t}' for c, t in zip(columns, types))
+                log.info(f'creating table {table} ({definition})')
+                con.execute(f'CREATE TABLE {quote(table)} ({definition})')
+
+            insert: str = f"INSERT INTO {quote(table)} ({', '.join(map(quote_identifier, columns))}) " \
+                          f"VALUES ({', '.join('?' * len(columns))})"
+            log.debug(insert)
+
+            batch: Optional[List[Sequence[Any]]] = first
+            while batch:
+                con.executemany(insert, batch)
+                progress.update(len(batch))
+                batch = next(batches, None)
+    finally:
+        for pragma, value in pragmas.items():
+            con.execute(f'PRAGMA {pragma} = {value}')
+
+    progress.done(f'into {table}')
+    return progress.rows
+
+
+def open_output(path: str, binary: bool = False, compression: Optional[str] = None) -> IO:
+    """Open path for writing through a BUFFER_SIZE buffer, compressed with compression (one of COMPRESSIONS) if set.
+    """
+    if compression:
+        raw: IO = io.BufferedWriter(COMPRESSIONS[compression][0](path, 'wb'), buffer_size=BUFFER_SIZE)
+    else:
+        raw = open(path, 'wb', buffering=BUFFER_SIZE)
+    return raw if binary else io.TextIOWrapper(raw, encoding='utf-8', newline='')
+
+
+def _delimited_writer(f: TextIO, columns: List[str], delimiter: str) -> Callable[[List[Sequence[Any]]], None]:
+    writer = csv.writer(f, delimiter=delimiter)
+    writer.writerow(columns)
+    return writer.writerows
+
+
+def _jsonl_writer(f: TextIO, columns: List[str]) -> Callable[[List[Sequence[Any]]], None]:
+    encoder = json.JSONEncoder(ensure_ascii=False, default=lambda blob: blob.hex())
+
+    def write(rows: List[Sequence[Any]]) -> None:
+        f.write(''.join(encoder.encode(dict(zip(columns, row))) + '\n' for row in rows))
+
+    return write
+
+
+_U8 = struct.Struct('<B')
+_U32 = struct.Struct('<I')
+_INT = struct.Struct('<Bq')
+_REAL = struct.Struct('<Bd')
+_SIZED = struct.Struct('<BI')
+
+
+def _binary_writer(f: IO, columns: List[str]) -> Callable[[List[Sequence[Any]]], None]:
+    f.write(BINARY_MAGIC + _U8.pack(BINARY_VERSION) + _U32.pack(len(columns)))
+    for name in columns:
+        encoded: bytes = name.encode('utf-8')
+        f.write(_U32.pack(len(encoded)) + encoded)
+
+    def value(v: Any) -> bytes:
+        if v is None:
+            return b'\x00'
+        elif isinstance(v, int):
+            return _INT.pack(1, v)
+        elif isinstance(v, float):
+            return _REAL.pack(2, v)
+        elif isinstance(v, str):
+            encoded: bytes = v.encode('utf-8')
+            return _SIZED.pack(3, len(encoded)) + encoded
+        return _SIZED.pack(4, len(v)) + bytes(v)
+
+    def write(rows: List[Sequence[Any]]) -> None:
+        f.write(b''.join(value(v) for row in rows for v in row))
+
+    return write
+
+
+def export_cursor(cursor: Cursor, path: str, fmt: str, compression: Optional[str] = None,
+                  batch_size: int = BATCH_SIZE) -> int:
+    """Write all rows from cursor to the file at path in fmt and return the number of rows.
+    """
+    columns: List[str] = [d[0] for d in cursor.description or []]
+    progress = Progress('Exported')
+
+    with open_output(path, binary=(fmt == 'binary'), compression=compression) as f:
+        if fmt == 'binary':
+            write: Callable[[List[Sequence[Any]]], None] = _binary_writer(f, columns)
+        elif fmt == 'jsonl':
+            write = _jsonl_writer(f, columns)
+        else:
+            write = _delimited_writer(f, columns, '\t' if fmt == 'tsv' else ',')
+
+        rows: List[Sequence[Any]] = cursor.fetchmany(batch_size)
+        while rows:
+            write(rows)
+            progress.update(len(rows))
+            rows = cursor.fetchmany(batch_size)
+
+    progress.done(f'to {path}')
+    return progress.rows
+
+
+def _sql_string(s: str) -> str:
+    return "'" + s.replace("'", "''") + "'"
+
+
+def matching_tables(con: Connection, patterns: Sequence[str] = ()) -> List[Tuple[str, str, str]]:
+    """(type, name, sql) of tables and views with names LIKE any of patterns (all of them if there are no patterns).
+    """
+    query: str = "SELECT type, name, sql FROM sqlite_master " \
+                 "WHERE type IN ('table', 'view') AND name NOT LIKE 'sqlite_%' AND sql IS NOT NULL"
+    if patterns:
+        query += f" AND ({' OR '.join('name LIKE ?' for _ in patterns)})"
+    # views last so that the tables they select from exist when they are created
+    query += " ORDER BY type = 'view', rowid"
+    return con.execute(query, tuple(patterns)).fetchall()
+
+
+def dump_table(con: Connection, kind: str, table: str, sql: str) -> Iterator[str]:
+    """SQL statements that re-create table (or view) with its rows, indexes and triggers.
+    """
+    if kind == 'view':
+        yield f'{sql};'
+        return
+
+    if sql.upper().startswith('CREATE VIRTUAL TABLE'):
+        # the shadow tables are dumped as ordinary tables so only the declaration is needed
+        yield f'{sql};'
+        return
+
+    yield f'{sql};'
+    # names from sqlite_master are never schema-qualified, dots are part of them
+    name: str = quote_identifier(table)
+    columns: List[str] = [row[1] for row in con.execute(f'PRAGMA table_info({name})')]
+    values: str = " || ',' || ".join(f'quote({quote_identifier(c)})' for c in columns)
+    # let SQLite render the literals, that is much faster than formatting every value in Python
+    for line, in con.execute(f"SELECT {_sql_string(f'INSERT INTO {name} VALUES(')} || {values} || ');' FROM {name}"):
+        yield line
+    # the AUTOINCREMENT counter, inserting the rows above sets it to the largest rowid which may be too low
+    if con.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_sequence'").fetchone() is not None:
+        for seq, in con.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (table,)):
+            yield f'DELETE FROM sqlite_sequence WHERE name = {_sql_string(table)};'
+            yield f'INSERT INTO sqlite_sequence VALUES({_sql_string(table)}, {seq});'
+    for extra, in con.execute("SELECT sql FROM sqlite_master WHERE type IN ('index', 'trigger') AND tbl_name = ? "
+                              "AND sql IS NOT NULL", (table,)):
+        yield f'{extra};'
+
+
+def dump_lines(con: Connection, patterns: Sequence[str] = ()) -> Iterator[str]:
+    """SQL statements that re-create the database, only tables (and views) with names LIKE any of patterns if given.
+    """
+    if not patterns:
+        yield from con.iterdump()
+        return
+
+    yield 'BEGIN TRANSACTION;'
+    for kind, name, sql in matching_tables(con, patterns):
+        yield from dump_table(con, kind, name, sql)
+    yield 'COMMIT;'
+
+
+def write_lines(f: TextIO, lines: Iterable[str]) -> int:
+    n: int = 0
+    for chunk in chunks(lines, BATCH_SIZE):
+        f.write('\n'.join(chunk) + '\n')
+        n += len(chunk)
+    return n
+
+
+def _dump_table_file(con: Connection, kind: str, table: str, sql: str, path: str,
+                     compression: Optional[str]) -> int:
+    with open_output(path, compression=compression) as f:
+        return write_lines(f, chain(['BEGIN TRANSACTION;'], dump_table(con, kind, table, sql), ['COMMIT;']))
+
+
+def _dump_table_file_with(connect: Callable[[], Connection], *args) -> int:
+    con: Connection = connect()
+    try:
+        return _dump_table_file(con, *args)
+    finally:
+        con.close()
+
+
+def _file_names(names: Iterable[str]) -> List[str]:
+    """A distinct file name for each table name, with path separators and other unsafe characters replaced.
+    """
+    used: Set[str] = set()
+    file_names: List[str] = []
+    for name in names:
+        base: str = _UNSAFE.sub('_', name) or '_'
+        file_name: str = base
+        n: int = 1
+        # case-insensitive file systems would otherwise overwrite e.g. "A b" with "a_b"
+        while file_name.lower() in used:
+            n += 1
+            file_name = f'{base}_{n}'
+        used.add(file_name.lower())
+        file_names.append(file_name)
+    return file_names
+
+
+def dump_split(con: Connection, connect: Optional[Callable[[], Connection]], directory: str,
+               patterns: Sequence[str] = (), compression: Optional[str] = None, jobs: int = 1) -> Dict[str, int]:
+    """Dump every table (or view) matching patterns into its own file in directory and return lines written per file.
+
+    With connect (a factory of read-only connections) tables are dumped by jobs threads, each with its own
+    connection, otherwise one by one through con.
+    """
+    suffix: str = '.sql' + (COMPRESSIONS[compression][1] if compression else '')
+    tables: List[Tuple[str, str, str]] = matching_tables(con, patterns)
+    paths: List[str] = [join(directory, f'{name}{suffix}') for name in _file_names(name for _, name, _ in tables)]
+
+    if connect is None or jobs < 2:
+        return {path: _dump_table_file(con, kind, name, sql, path, compression)
+                for (kind, name, sql), path in zip(tables, paths)}
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(_dump_table_file_with, connect, kind, name, sql, path, compression)
+                   for (kind, name, sql), path in zip(tables, paths)]
+        return {path: future.result() for path, future in zip(paths, futures)}
@@ -1,48 +1,143 @@
 """
 Many of the functions in this module simply populate the context object with required key-value pairs.
+
+prompt_toolkit, pygments and tabulate are imported by the functions that use them, non-interactive runs (and --help)
+never load them.
 """
 
 import sqlite3
+import sys
 from logging import Logger, getLogger
 from os import getenv
-from os.path import expanduser, isfile
-from sqlite3 import Cursor
-from typing import Dict, Any
-
-from prompt_toolkit import PromptSession, HTML
-from prompt_toolkit.auto_suggest import ThreadedAutoSuggest, AutoSuggestFromHistory
-from prompt_toolkit.history import ThreadedHistory, FileHistory
-from prompt_toolkit.lexers import PygmentsLexer
-from prompt_toolkit.styles import style_from_pygments_cls
-from pygments.lexers.sql import SqlLexer
-from pygments.styles import get_style_by_name
-from tabulate import tabulate
-
-from .context import Context, SqliteCtxt
-from .completions import SQLiteCompleter
+from os.path import abspath, expanduser, isfile
+from sqlite3 import Connection, Cursor
+from typing import Callable, Dict, FrozenSet, Hashable, Optional
+
+from .context import SqliteCtxt
+from . import columns, profiles
+from .columns import Recorder, ResultSet
+from .executor import Stats
+from .schema import SchemaCache
 
 log: Logger = getLogger()
 
+# context attributes shown in the bottom toolbar
+TOOLBAR: FrozenSet[str] = frozenset({'PWD', 'backup_status', 'database', 'multiline', 'show_stats', 'stats', 'style',
+                                     'table_style', 'timer'})
+
+
+def toolbar_markup(context: SqliteCtxt) -> str:
+    s = "SQLite3 REPL"
+
+    def entry(k: str, v: str) -> str:
+        return f" | <b><style bg=\"ansiblue\">{k.capitalize()}</style></b> {v}"
+
+    s += entry('database', context.database)
+    s += entry('multiline', bool(context.multiline))
+    s += entry('directory', context.PWD)
+    s += entry('style', context.style)
+    s += entry('tables', context.table_style)
+    if context.stats is not None and (context.timer or context.show_stats):
+        s += entry('last', context.stats.summary())
+    if context.backup_status:
+        s += entry('backup', context.backup_status)
+
+    # NOT WORKING
+    # s += entry('style', context.prompt_session.style)
+
+    return s
+
 
 def set_toolbar(context: SqliteCtxt) -> None:
-    def custom_toolbar(context: SqliteCtxt) -> HTML:
-        s = "SQLite3 REPL"
+    """Show the toolbar in the prompt session, it is rebuilt only after one of the TOOLBAR attributes changed.
+    """
+    from prompt_toolkit import HTML
+
+    cache: Dict[str, HTML] = {}
+
+    def changed(name: str) -> None:
+        if name in TOOLBAR and cache:
+            cache.clear()
+            # e.g. the status of a background backup, redraw without waiting for a key press
+            if context.prompt_session is not None and context.prompt_session.app.is_running:
+                context.prompt_session.app.invalidate()
+
+    def toolbar() -> HTML:
+        if not cache:
+            cache['html'] = HTML(toolbar_markup(context))
+        return cache['html']
+
+    context.subscribe('toolbar', changed)
+    context.prompt_session.bottom_toolbar = toolbar
+
+
+def set_stats(context: SqliteCtxt, stats: Stats) -> None:
+    """Keep stats of the last statement for the toolbar and print them if .timer or .stats is on.
+    """
+    context.stats = stats
+    if context.timer:
+        print(stats.timer())
+    if context.show_stats:
+        print(stats.report())
+
+
+def record(context: SqliteCtxt, cursor: Cursor, key: Optional[Hashable] = None) -> Recorder:
+    """Wrap cursor so that its rows become the last result (for .sort, .filter and .last) once they have all been
+    fetched, and are cached under key if there is one.
+    """
+    budget: int = columns.BUDGET if key is None else max(columns.BUDGET, context.cache.budget)
+    # whatever becomes of this statement, the result of the previous one is not the last any more
+    context.last = None
+    context.last_missing = None
+
+    def dropped() -> None:
+        context.last_missing = f'the last result was over {columns.BUDGET / 1024 ** 2:g} MiB'
+
+    def done(result: ResultSet) -> None:
+        if result.size <= columns.BUDGET:
+            context.last = result
+        else:
+            dropped()
+        if key is not None and context.cache is not None:
+            context.cache.put(key, result)
+
+    return Recorder(cursor, budget, done, dropped)
 
-        def entry(k: str, v: str) -> str:
-            return f" | <b><style bg=\"ansiblue\">{k.capitalize()}</style></b> {v}"
 
-        s += entry('database', context.database)
-        s += entry('multiline', context.prompt_session.multiline)
-        s += entry('directory', context.PWD)
-        s += entry('style', context.style)
-        s += entry('tables', context.table_style)
+def set_schema_cache(context: SqliteCtxt) -> None:
+    if context.schema is None:
+        context.schema = SchemaCache()
+    if context.database in {':memory:', ''}:
+        context.schema.refresh(context.con)
+    else:
+        database: str = context.database if context.database.startswith('file:') else abspath(context.database)
+        context.schema.refresh(context.con, database, read_only(context))
+
+
+def connect(context: SqliteCtxt, database: str, **kwargs) -> Connection:
+    """Open a connection to database configured from context (every connection the REPL works with goes through here).
 
-        # NOT WORKING
-        # s += entry('style', context.prompt_session.style)
+    Connections are not tied to the thread that opened them because statements run on a worker thread (see executor)
+    and are tuned with the PRAGMAs of the profile in context.
+    """
+    log.debug(f'connecting to {database} (caching {context.cached_statements} statements, {context.profile} profile)')
+    kwargs.setdefault('check_same_thread', False)
+    con: Connection = sqlite3.connect(database, cached_statements=context.cached_statements, **kwargs)
+    profiles.apply(con, context.profile or 'default')
+    return con
 
-        return HTML(s)
 
-    context.prompt_session.bottom_toolbar = lambda: custom_toolbar(context)
+def read_only(context: SqliteCtxt) -> Optional[Callable[[], Connection]]:
+    """Factory of read-only connections to the open database (None for in-memory databases).
+
+    The connections may be created and used on any thread.
+    """
+    if context.database in {':memory:', ''}:
+        return None
+    uri: str = context.database
+    if not uri.startswith('file:'):
+        uri = f'file:{abspath(uri)}?mode=ro'
+    return lambda: connect(context, uri, uri=True, check_same_thread=False)
 
 
 def set_db_con(context: SqliteCtxt) -> None:
@@ -50,21 +145,34 @@ def set_db_con(context: SqliteCtxt) -> None:
         if isfile(context.database):
             log.info(f"opening {context.database} in READ-ONLY mode")
             context.database = f'file:{context.database}?mode=ro'
-            context.con = sqlite3.connect(context.database, uri=True)
+            context.con = connect(context, context.database, uri=True)
         else:
             raise Exception(f"Database must exist to be opened in READ-ONLY mode.")
 
     if context.database == ':memory:':
         log.info("opened in-memory database")
-        context.con = sqlite3.connect(context.database)
+        context.con = connect(context, context.database)
 
     else:
         if not isfile(context.database):
-            print(f"Creating new database in {context.database}.")
-        context.con = sqlite3.connect(context.database)
+            print(f"Creating new database in {context.database}.", file=sys.stderr)
+        context.con = connect(context, context.database)
+
+    if context.profile and context.profile != 'default':
+        print(profiles.describe(context.con, context.profile), file=sys.stderr)
 
 
 def set_prompt_sess(context: SqliteCtxt) -> None:
+    from prompt_toolkit import PromptSession
+    from prompt_toolkit.auto_suggest import ThreadedAutoSuggest, AutoSuggestFromHistory
+    from prompt_toolkit.history import ThreadedHistory, FileHistory
+    from prompt_toolkit.lexers import PygmentsLexer
+    from prompt_toolkit.styles import style_from_pygments_cls
+    from pygments.lexers.sql import SqlLexer
+    from pygments.styles import get_style_by_name
+
+    from .completions import SQLiteCompleter
+
     context.prompt_session = PromptSession(
         message=context.prompt,
         history=ThreadedHistory(FileHistory(expanduser(context.history))),
@@ -73,17 +181,28 @@ def set_prompt_sess(context: SqliteCtxt) -> None:
         multiline=bool(context.multiline),
         lexer=PygmentsLexer(SqlLexer),
         style=style_from_pygments_cls(get_style_by_name(context.style)),
-        completer=SQLiteCompleter(),
+        completer=SQLiteCompleter(context.schema),
         enable_history_search=context.history_search,
         complete_while_typing=context.complete_while_typing,
         enable_open_in_editor=bool(context.editor))
 
+    def changed(name: str) -> None:
+        if name == 'prompt':
+            context.prompt_session.message = context.prompt
+        elif name == 'style':
+            context.prompt_session.style = style_from_pygments_cls(get_style_by_name(context.style))
+        elif name == 'multiline':
+            context.prompt_session.multiline = bool(context.multiline)
+
+    context.subscribe('prompt', changed)
+
     # bottom_toolbar=((lambda: custom_toolbar(context)) if context.infobar else None),
+    set_toolbar(context)
 
 
 def set_env_vars(context: SqliteCtxt) -> None:
     for env_var in ['EDITOR', 'PWD', 'PAGER', 'CDPATH', 'PATH', 'BROWSER', 'HOME', 'USER', 'LANG', 'LC_ALL']:
-        context[env_var] = getenv(env_var, None)
+        setattr(context, env_var, getenv(env_var, None))
 
 
 def set_verbosity(context: SqliteCtxt) -> None:
@@ -96,16 +215,13 @@ def set_verbosity(context: SqliteCtxt) -> None:
             format="%(levelname)s:%(asctime)s  %(message)s")
 
 
-def eval_sql_script(context: SqliteCtxt) -> None:
-    # evaluate SQL script before entering interactive mode
-    if context.eval:
-        log.info(f'reading SQL from {context.eval}')
-        if isfile(context.eval):
-            with context.con as c:
-                with open(context.eval, encoding='utf-8') as f:
-                    cursor: Cursor = c.cursor()
-                    cursor.executescript(f.read())
-                    print(tabulate(cursor.fetchall(), tablefmt=context.table_style))
-                    cursor.close()
-        else:
-            raise FileNotFoundError(f'could not read SQL from {context.eval}, not a valid file')
+def eval_sql_script(context: SqliteCtxt) -> int:
+    """Run the script given with -e (before the REPL or the batch) and return its exit status.
+    """
+    from .batch import run
+
+    if not context.eval:
+        return 0
+    if not isfile(context.eval):
+        raise FileNotFoundError(f'could not read SQL from {context.eval}, not a valid file')
+    return run(context, file=context.eval, fmt='table')